@@ -0,0 +1,64 @@
+FILTER_BITS = 12
+FILTER_MASK = (1 << FILTER_BITS) - 1
+
+
+class AncestorFilter:
+    """
+    Counting Bloom filter of the tags, ids and classes of the elements above
+    the node being styled. style() pushes an element before styling its
+    children and pops it afterwards. A key the filter says is absent is
+    certainly not on any ancestor; one it says is present may still not be.
+    """
+    def __init__(self):
+        self.counts = [0] * (1 << FILTER_BITS)
+
+    @classmethod
+    def above(cls, node):
+        """
+        Returns a filter holding every ancestor of node.
+        """
+        ancestors = cls()
+        node = node.parent
+        while node:
+            ancestors.push(node)
+            node = node.parent
+        return ancestors
+
+    def push(self, elt):
+        for key in element_keys(elt):
+            for slot in filter_slots(key):
+                self.counts[slot] += 1
+
+    def pop(self, elt):
+        for key in element_keys(elt):
+            for slot in filter_slots(key):
+                self.counts[slot] -= 1
+
+    def may_contain_all(self, slots):
+        """
+        Takes the filter_slots of several keys. Returns false if any key is absent.
+        """
+        counts = self.counts
+        for first, second in slots:
+            if not counts[first] or not counts[second]: return False
+        return True
+
+
+def element_keys(elt):
+    """
+    The filter keys for an element, written the way selectors write them.
+    """
+    yield elt.tag
+    attributes = elt.attributes
+    if "id" in attributes:
+        yield "#" + attributes["id"]
+    if "class" in attributes:
+        for name in attributes["class"].split():
+            yield "." + name
+
+def filter_slots(key):
+    """
+    Two counter positions for key, taken from different bits of its hash.
+    """
+    h = hash(key)
+    return h & FILTER_MASK, (h >> FILTER_BITS) & FILTER_MASK
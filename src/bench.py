@@ -0,0 +1,523 @@
+"""
+Benchmarks for the browser engine. Run from src/:
+
+    python bench.py h2 [count] [workers]    (needs ../test/h2_test_server.py running)
+    python bench.py parse [megabytes...]
+    python bench.py memory [nodes]
+    python bench.py query [nodes] [queries]
+    python bench.py innerhtml [nodes] [updates]
+    python bench.py typing [nodes] [keys]
+    python bench.py render [nodes]
+    python bench.py style [nodes] [rules] [depth]
+    python bench.py sheets [tabs] [rules]
+    python bench.py inline [elements] [renders]
+    python bench.py selectors [nodes] [rules] [depth]
+    python bench.py article [words] [vocabulary]
+    python bench.py fonts [nodes] [renders]
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def bench_h2(count=30, workers=6):
+    """
+    Fetches count resources from the local h2 test server with HTTP/1.1 keep-alive
+    and with HTTP/2 prior knowledge, using a fetch pool like Tab's.
+    """
+    import http2
+    from connection import CONNECTION_POOL
+    from url import URL
+
+    host, port = "localhost", 8001
+    urls = [URL(f"http://{host}:{port}/script{i}.js") for i in range(count)]
+    for protocol in ["http/1.1", "h2"]:
+        CONNECTION_POOL.close_all()
+        CONNECTION_POOL.h2_origins.clear()
+        CONNECTION_POOL.hits = CONNECTION_POOL.misses = 0
+        http2.PRIOR_KNOWLEDGE.discard((host, port))
+        if protocol == "h2":
+            http2.PRIOR_KNOWLEDGE.add((host, port))
+        # Warm up with one request, as a page's document request would
+        urls[0].request(None)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda url: url.request(None), urls))
+            elapsed = time.perf_counter() - start
+        stats = CONNECTION_POOL.stats()
+        print(f"{protocol:9} {count} requests, {workers} workers: "
+              f"{elapsed * 1000:8.1f} ms, {stats['misses']} connections opened")
+
+
+def generate_document(size):
+    """
+    Returns an HTML document of about size characters with a realistic mix of
+    nested blocks, inline markup, attributes and text.
+    """
+    section = (
+        '<div class="section" id="s{i}">'
+        '<h2 title="Section {i} heading">Section {i}</h2>'
+        '<p class="lead">Lorem ipsum <b>dolor</b> sit amet, consectetur '
+        '<a href="/page/{i}.html">adipiscing</a> elit, sed do eiusmod tempor '
+        'incididunt ut labore et <i>dolore magna</i> aliqua.</p>'
+        '<ul><li>First item</li><li>Second item</li><li>Third item</li></ul>'
+        '<p>Ut enim ad minim veniam, quis nostrud exercitation ullamco '
+        'laboris nisi ut aliquip ex ea commodo consequat.<br>'
+        '<input name="field{i}" value="some text"></p>'
+        '</div>\n'
+    )
+    parts = ["<!doctype html><html><head><title>Benchmark</title></head><body>"]
+    length, i = 0, 0
+    while length < size:
+        part = section.format(i=i)
+        parts.append(part)
+        length += len(part)
+        i += 1
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def bench_parse(*megabytes):
+    """
+    Reports HTMLParser throughput in MB/s on generated documents.
+    """
+    from htmlparser import HTMLParser
+
+    for mb in megabytes or (1, 10):
+        body = generate_document(mb * 1024 * 1024)
+        start = time.perf_counter()
+        HTMLParser(body).parse()
+        elapsed = time.perf_counter() - start
+        print(f"parse {mb:3} MB: {elapsed:7.3f} s, {len(body) / elapsed / 1e6:6.2f} MB/s")
+
+
+def bench_memory(nodes=100000):
+    """
+    Reports the memory held by a parsed DOM of about the given number of nodes,
+    as measured by tracemalloc.
+    """
+    import gc
+    import tracemalloc
+    from htmlparser import HTMLParser
+    from utils import tree_to_list
+
+    # One generated section has about 30 nodes and 700 characters
+    body = generate_document(nodes * 700 // 30)
+    gc.collect()
+    tracemalloc.start()
+    root = HTMLParser(body).parse()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(tree_to_list(root, []))
+    print(f"memory {count} nodes: {used / 1e6:7.1f} MB, {used / count:6.1f} bytes/node")
+
+
+def bench_query(nodes=100000, queries=200):
+    """
+    Times querySelectorAll-style lookups on a large document with a full tree
+    scan and with the DOM index.
+    """
+    from cssparser import CSSParser
+    from htmlparser import HTMLParser
+    from utils import tree_to_list
+
+    parser = HTMLParser(generate_document(nodes * 700 // 30))
+    root = parser.parse()
+    count = len(tree_to_list(root, []))
+    for text in ["#s500", ".lead", "input", "div h2", "ul li"]:
+        selector = CSSParser(text).selector()
+        start = time.perf_counter()
+        for _ in range(queries // 20):
+            found = [node for node in tree_to_list(root, []) if selector.matches(node)]
+        scan = (time.perf_counter() - start) / (queries // 20)
+        start = time.perf_counter()
+        for _ in range(queries):
+            indexed = parser.index.query(selector, root)
+        index = (time.perf_counter() - start) / queries
+        assert found == indexed
+        print(f"query {text!r:10} {len(found):6} of {count} nodes: "
+              f"scan {scan * 1000:8.3f} ms, index {index * 1000:8.3f} ms")
+
+
+def load_tab(nodes, streamed=False):
+    """
+    Returns a rendered Tab showing a generated document, without fetching it.
+    If streamed, the document is fed to the parser in network-sized pieces and
+    rendered once the first screenful is parsed, as Tab.load does.
+    """
+    from constants import HSTEP, VSTEP, WIDTH
+    from http_body import READ_SIZE
+    from htmlparser import HTMLParser
+    from tab import DEFAULT_RULE_SET, DEFAULT_STYLE_SHEET, Tab
+
+    tab = Tab(600, None)
+    tab.style_sheets = [DEFAULT_STYLE_SHEET]
+    tab.rule_set = DEFAULT_RULE_SET
+    body = generate_document(nodes * 700 // 30)
+    if not streamed:
+        parser = HTMLParser(body)
+        tab.nodes = parser.parse()
+        tab.dom_index = parser.index
+        tab.render()
+        return tab
+    parser = HTMLParser()
+    first_screen = (WIDTH // HSTEP) * (tab.tab_height // VSTEP)
+    painted = False
+    for start in range(0, len(body), READ_SIZE):
+        parser.feed(body[start:start + READ_SIZE])
+        if not painted and parser.text_length >= first_screen:
+            tab.nodes = parser.root()
+            tab.render()
+            painted = True
+    tab.nodes = parser.close()
+    tab.dom_index = parser.index
+    tab.nodes.mark_style_dirty()
+    tab.render()
+    return tab
+
+
+def bench_innerhtml(nodes=20000, updates=20):
+    """
+    Times repeated innerHTML updates of one widget in a large document, with
+    the whole page marked dirty after each and with only the widget dirty.
+    """
+    from htmlparser import HTMLParser
+
+    for mode in ["full", "dirty"]:
+        tab = load_tab(nodes)
+        widget = next(iter(tab.dom_index.with_id("s10")))
+        start = time.perf_counter()
+        for i in range(updates):
+            # The same steps as JSContext.innerHTML_set
+            new_nodes = HTMLParser(f"<p>Update <b>{i}</b></p>" * (i % 3 + 1)) \
+                .parse_fragment(widget)
+            for child in widget.children:
+                tab.dom_index.remove_tree(child)
+            widget.children = new_nodes
+            for child in widget.children:
+                tab.dom_index.add_tree(child)
+            widget.mark_style_dirty()
+            if mode == "full":
+                tab.nodes.mark_style_dirty()
+            tab.render()
+        elapsed = (time.perf_counter() - start) / updates
+        print(f"innerHTML {mode:5} render: {elapsed * 1000:8.2f} ms per update, "
+              f"{len(tab.display_list)} draw commands")
+
+
+def bench_typing(nodes=20000, keys=20):
+    """
+    Times typing into an input in a large document, with the whole page marked
+    dirty after each key and with only the input paint-dirty, the latter also
+    on a document streamed in with a first paint.
+    """
+    for mode in ["full", "dirty", "streamed"]:
+        tab = load_tab(nodes, streamed=mode == "streamed")
+        field = list(tab.dom_index.tagged("input"))[10]
+        tab.focus = field
+        field.is_focused = True
+        times = []
+        for i in range(keys):
+            start = time.perf_counter()
+            # The same steps as Tab.keypress
+            field.set_attribute("value", field.attributes["value"] + "x")
+            field.mark_paint_dirty()
+            if mode == "full":
+                tab.nodes.mark_style_dirty()
+            tab.render()
+            times.append(time.perf_counter() - start)
+        print(f"keypress {mode:8} render: {sum(times) / keys * 1000:8.2f} ms per key, "
+              f"first {times[0] * 1000:8.2f} ms")
+
+
+def bench_render(nodes=20000):
+    """
+    Times each phase of a full render of a large document: style, layout, paint
+    and raster.
+    """
+    import skia
+    from cssparser import style
+    from document_layout import DocumentLayout
+    from utils import paint_tree
+
+    tab = load_tab(nodes)
+    start = time.perf_counter()
+    style(tab.nodes, tab.rule_set)
+    styled = time.perf_counter()
+    document = DocumentLayout(tab.nodes)
+    document.layout()
+    laid_out = time.perf_counter()
+    display_list = []
+    paint_tree(document, display_list)
+    painted = time.perf_counter()
+    canvas = skia.Surface(800, 600).getCanvas()
+    for cmd in display_list:
+        cmd.execute(canvas)
+    rastered = time.perf_counter()
+    print(f"render {nodes} nodes: style {(styled - start) * 1000:7.1f} ms, "
+          f"layout {(laid_out - styled) * 1000:7.1f} ms, "
+          f"paint {(painted - laid_out) * 1000:7.1f} ms, "
+          f"raster {(rastered - painted) * 1000:7.1f} ms")
+
+
+def generate_style_sheet(count):
+    """
+    Returns a stylesheet of count rules keyed on a mix of tags, classes, ids and
+    descendant selectors, most of which match nothing in generate_document.
+    """
+    tags = ["div", "p", "h2", "a", "b", "i", "li", "ul", "span", "input"]
+    rules = []
+    for i in range(count):
+        tag = tags[i % len(tags)]
+        selector = [tag, f".c{i}", f"#s{i}", f"div {tag}", f"section .c{i} {tag}"][i % 5]
+        rules.append(f"{selector} {{ color: blue; margin: {i}px; }}")
+    rules.append(".lead { font-size: 120%; }")
+    return "\n".join(rules)
+
+
+def bench_style(nodes=20000, rules=1000, depth=20):
+    """
+    Times styling a large document, with its content nested depth elements
+    deep, against a large stylesheet: testing every rule on every node, and
+    with rules bucketed in a RuleSet.
+    """
+    from cssparser import CSSParser, cascade_priority, style
+    from htmlparser import HTMLParser
+    from rule_set import RuleSet
+    from style_sharing import STYLE_SHARING_CACHE
+    from tab import DEFAULT_STYLE_SHEET
+
+    body = generate_document(nodes * 700 // 30)
+    body = body.replace("<body>", "<body>" + "<div>" * depth)
+    root = HTMLParser(body).parse()
+    sheet = list(DEFAULT_STYLE_SHEET.rules) + CSSParser(generate_style_sheet(rules)).parse()
+
+    class EveryRule:
+        """The old cascade: every rule, sorted by priority on each render."""
+        def __init__(self, rules):
+            self.rules = rules
+            self.used_keys = RuleSet(rules).used_keys
+        def matching(self, node, ancestors):
+            return [(selector, body) for selector, body in self.rules
+                    if selector.matches(node)]
+
+    class WithoutFilter:
+        """A RuleSet that walks the ancestors for every descendant selector."""
+        def __init__(self, rule_set):
+            self.rule_set = rule_set
+            self.used_keys = rule_set.used_keys
+        def matching(self, node, ancestors):
+            return self.rule_set.matching(node)
+
+    for name, make in [
+        ("every rule", lambda: EveryRule(sorted(sheet, key=cascade_priority))),
+        ("rule set", lambda: WithoutFilter(RuleSet(sheet))),
+        ("rule set + ancestor filter", lambda: RuleSet(sheet)),
+    ]:
+        start = time.perf_counter()
+        style(root, make())
+        elapsed = time.perf_counter() - start
+        print(f"style {len(sheet)} rules, {name:26}: {elapsed * 1000:9.1f} ms")
+    stats = STYLE_SHARING_CACHE.stats()
+    print(f"style sharing: {stats['hits']} hits, {stats['misses']} misses, "
+          f"hit rate {stats['hit_rate']:.1%}")
+
+
+def bench_sheets(tabs=10, rules=1000):
+    """
+    Times the CSS work of loading the same page in several tabs, parsing and
+    compiling its stylesheet every time and through STYLE_SHEET_CACHE.
+    """
+    from cssparser import CSSParser
+    from rule_set import RuleSet
+    from style_sheet_cache import STYLE_SHEET_CACHE
+    from tab import DEFAULT_STYLE_SHEET
+
+    text = generate_style_sheet(rules)
+    url = "http://localhost:8000/site.css"
+    for name in ["no cache", "cache"]:
+        times = []
+        for _ in range(tabs):
+            start = time.perf_counter()
+            if name == "cache":
+                sheet = STYLE_SHEET_CACHE.get(url, text)
+                STYLE_SHEET_CACHE.rule_set([DEFAULT_STYLE_SHEET, sheet])
+            else:
+                RuleSet(list(DEFAULT_STYLE_SHEET.rules) + CSSParser(text).parse())
+            times.append(time.perf_counter() - start)
+        print(f"sheets {name:8}: first tab {times[0] * 1000:8.2f} ms, "
+              f"tab {tabs} {times[-1] * 1000:8.3f} ms")
+
+
+def bench_inline(elements=1000, renders=5):
+    """
+    Times restyling a document of inline-styled elements, parsing each style
+    attribute every time and through INLINE_STYLE_CACHE.
+    """
+    from cssparser import style
+    from inline_style_cache import INLINE_STYLE_CACHE
+    from htmlparser import HTMLParser
+    from tab import DEFAULT_RULE_SET
+
+    body = "".join(
+        f'<p style="color: #{i % 16 * 16:02x}0000; font-size: {i % 20 + 10}px; '
+        f'margin: {i}px; background-color: lightblue">Item {i}</p>'
+        for i in range(elements))
+    root = HTMLParser(body).parse()
+    for name, max_entries in [("no cache", 0), ("cache", INLINE_STYLE_CACHE.max_entries)]:
+        INLINE_STYLE_CACHE.max_entries = max_entries
+        INLINE_STYLE_CACHE.entries.clear()
+        INLINE_STYLE_CACHE.hits = INLINE_STYLE_CACHE.misses = 0
+        start = time.perf_counter()
+        for _ in range(renders):
+            style(root, DEFAULT_RULE_SET)
+        elapsed = (time.perf_counter() - start) / renders
+        stats = INLINE_STYLE_CACHE.stats()
+        print(f"inline styles {name:8}: {elapsed * 1000:8.2f} ms per restyle, "
+              f"hit rate {stats['hit_rate']:.1%}")
+
+
+def bench_selectors(nodes=20000, rules=1000, depth=20):
+    """
+    Times testing every rule of a large stylesheet against every element of a
+    large document, with the selector objects' matches() and with functions
+    compiled by SELECTOR_COMPILER.
+    """
+    from cssparser import CSSParser
+    from dom_index import elements
+    from htmlparser import HTMLParser
+    from selector_compiler import SELECTOR_COMPILER, compile_selector
+
+    body = generate_document(nodes * 700 // 30)
+    body = body.replace("<body>", "<body>" + "<div>" * depth)
+    root = HTMLParser(body).parse()
+    nodes = list(elements(root))
+    selectors = [selector for selector, _ in CSSParser(generate_style_sheet(rules)).parse()]
+    start = time.perf_counter()
+    compiled = [compile_selector(selector) for selector in selectors]
+    compile_time = time.perf_counter() - start
+    results = {}
+    for name, matchers in [
+        ("object tree", [selector.matches for selector in selectors]),
+        ("compiled", compiled),
+    ]:
+        start = time.perf_counter()
+        results[name] = [sum(1 for node in nodes if match(node)) for match in matchers]
+        elapsed = time.perf_counter() - start
+        print(f"selectors {len(selectors)} x {len(nodes)} elements, {name:11}: "
+              f"{elapsed * 1000:9.1f} ms")
+    assert results["object tree"] == results["compiled"]
+    for selector in selectors:
+        SELECTOR_COMPILER.get(selector)
+    start = time.perf_counter()
+    for selector in selectors:
+        SELECTOR_COMPILER.get(selector)
+    cached = time.perf_counter() - start
+    print(f"compiling {len(selectors)} selectors: {compile_time * 1000:.1f} ms, "
+          f"from the cache {cached * 1000:.2f} ms")
+
+
+def generate_article(words, vocabulary):
+    """
+    Returns a long article of words drawn from vocabulary distinct words, in
+    paragraphs with some bold and italic runs.
+    """
+    paragraphs = []
+    for start in range(0, words, 100):
+        text = " ".join(f"word{(i * 7919) % vocabulary}"
+                        for i in range(start, min(start + 100, words)))
+        paragraphs.append(f"<p>{text[:200]} <b>{text[200:300]}</b> "
+                          f"<i>{text[300:400]}</i> {text[400:]}</p>")
+    return "<body>" + "".join(paragraphs) + "</body>"
+
+
+def bench_article(words=50000, vocabulary=2000):
+    """
+    Times laying out and painting a long article, measuring every word with
+    Skia each time and through TEXT_METRICS.
+    """
+    from cssparser import style
+    from document_layout import DocumentLayout
+    from htmlparser import HTMLParser
+    from tab import DEFAULT_RULE_SET
+    from text_metrics import TEXT_METRICS
+    from utils import paint_tree
+
+    root = HTMLParser(generate_article(words, vocabulary)).parse()
+    style(root, DEFAULT_RULE_SET)
+    for name, max_entries in [("no cache", 0), ("cache", TEXT_METRICS.max_entries)]:
+        TEXT_METRICS.max_entries = max_entries
+        TEXT_METRICS.entries.clear()
+        TEXT_METRICS.hits = TEXT_METRICS.misses = 0
+        start = time.perf_counter()
+        document = DocumentLayout(root)
+        document.layout()
+        laid_out = time.perf_counter()
+        paint_tree(document, [])
+        painted = time.perf_counter()
+        stats = TEXT_METRICS.stats()
+        print(f"article {words} words, {name:8}: layout {(laid_out - start) * 1000:7.1f} ms, "
+              f"paint {(painted - laid_out) * 1000:7.1f} ms, "
+              f"{stats['misses']} of {stats['hits'] + stats['misses']} widths measured")
+
+
+def bench_fonts(nodes=20000, renders=3):
+    """
+    Counts the skia.Font objects built and the Skia metrics and measureText
+    calls made by full renders of a text-heavy page.
+    """
+    import skia
+
+    counts = {"fonts": 0, "metrics": 0, "measures": 0}
+    class CountingFont(skia.Font):
+        def __init__(self, *args):
+            counts["fonts"] += 1
+            super().__init__(*args)
+        def getMetrics(self):
+            counts["metrics"] += 1
+            return super().getMetrics()
+        def measureText(self, *args):
+            counts["measures"] += 1
+            return super().measureText(*args)
+    skia.Font = CountingFont
+
+    start = time.perf_counter()
+    tab = load_tab(nodes)
+    elapsed = time.perf_counter() - start
+    print(f"fonts first load: {counts['fonts']:6} fonts, "
+          f"{counts['metrics']:6} getMetrics, {counts['measures']:6} measureText, "
+          f"{elapsed * 1000:7.1f} ms")
+    for i in range(renders):
+        for name in counts:
+            counts[name] = 0
+        tab.nodes.mark_style_dirty()
+        tab.document = None
+        start = time.perf_counter()
+        tab.render()
+        elapsed = time.perf_counter() - start
+        print(f"fonts render {i + 1}: {counts['fonts']:6} fonts, "
+              f"{counts['metrics']:6} getMetrics, {counts['measures']:6} measureText, "
+              f"{elapsed * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    benchmarks = {
+        "h2": bench_h2,
+        "parse": bench_parse,
+        "memory": bench_memory,
+        "query": bench_query,
+        "innerhtml": bench_innerhtml,
+        "typing": bench_typing,
+        "render": bench_render,
+        "style": bench_style,
+        "sheets": bench_sheets,
+        "inline": bench_inline,
+        "selectors": bench_selectors,
+        "article": bench_article,
+        "fonts": bench_fonts,
+    }
+    name = sys.argv[1] if len(sys.argv) > 1 else None
+    if name not in benchmarks:
+        print("usage: python bench.py {" + ",".join(benchmarks) + "} [args...]")
+        sys.exit(1)
+    benchmarks[name](*[int(arg) for arg in sys.argv[2:]])
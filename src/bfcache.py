@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from lru import hit_rate
+from utils import tree_to_list
+
+
+MAX_BFCACHE_PAGES = 4
+BFCACHE_MEMORY_LIMIT = 32 * 1024 * 1024
+# Rough cost of one DOM node, layout object or display list command
+OBJECT_SIZE_ESTIMATE = 400
+
+
+class CachedPage:
+    """
+    Everything needed to show a page again without fetching, parsing or running scripts.
+    """
+    def __init__(self, tab):
+        self.nodes = tab.nodes
+        self.dom_index = tab.dom_index
+        self.style_sheets = tab.style_sheets
+        self.rule_set = tab.rule_set
+        self.document = tab.document
+        self.display_list = tab.display_list
+        self.scroll = tab.scroll
+        self.allowed_origins = tab.allowed_origins
+        self.js = tab.js
+        # Timings stay with their page, as performance entries and HAR exports
+        # are relative to its load
+        self.load_start = tab.load_start
+        self.wall_start = tab.wall_start
+        self.load_timing = tab.load_timing
+        self.resource_timings = tab.resource_timings
+        objects = len(tree_to_list(self.nodes, [])) + \
+            len(tree_to_list(self.document, [])) + len(self.display_list)
+        self.size = objects * OBJECT_SIZE_ESTIMATE
+
+    def discard(self):
+        self.js.discarded = True
+
+
+class BackForwardCache:
+    """
+    LRU of recently left pages, keyed by their history entry.
+    """
+    def __init__(self, max_pages=MAX_BFCACHE_PAGES, memory_limit=BFCACHE_MEMORY_LIMIT):
+        self.max_pages = max_pages
+        self.memory_limit = memory_limit
+        self.pages = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def store(self, entry, page: CachedPage):
+        if entry in self.pages:
+            self.remove(entry).discard()
+        if page.size > self.memory_limit:
+            page.discard()
+            return
+        self.pages[entry] = page
+        self.size += page.size
+        while len(self.pages) > self.max_pages or self.size > self.memory_limit:
+            _, evicted = self.pages.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+            evicted.discard()
+
+    def take(self, entry):
+        """
+        Removes and returns the page cached for a history entry, or None.
+        """
+        page = self.remove(entry)
+        if page:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return page
+
+    def remove(self, entry):
+        page = self.pages.pop(entry, None)
+        if page: self.size -= page.size
+        return page
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": hit_rate(self.hits, self.misses),
+            "pages": len(self.pages),
+            "bytes": self.size,
+        }
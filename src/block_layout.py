@@ -1,8 +1,13 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from operator import add
 from input_layout import InputLayout
 from text import Text
 from element import Element
 from text_layout import LineLayout, TextLayout
-from utils import get_font
+from text_metrics import TEXT_METRICS
+from utils import tree_to_list
 from draw import DrawRRect
 import skia
 
@@ -24,6 +29,11 @@ class BlockLayout:
         self.parent = parent
         self.previous = previous
         self.children = []
+        self.mode = None
+        self.layout_dirty = True
+        # An inline block keeps the display list of its lines while paint-clean
+        self.paint_dirty = True
+        self.paint_cache = None
     
     def layout_mode(self):
         if isinstance(self.node, Text):
@@ -39,31 +49,52 @@ class BlockLayout:
             return "block"
     
     def layout(self):
-        self.x = self.parent.x
+        x = self.parent.x
         if self.previous:
-            self.y = self.previous.y + self.previous.height
+            y = self.previous.y + self.previous.height
         else:
-            self.y = self.parent.y
-        self.width = self.parent.width
+            y = self.parent.y
+        width = self.parent.width
         
+        # A block whose subtree has not changed keeps its layout, and at most
+        # moves when content above it changed height
+        node = self.node
+        if not self.layout_dirty and not node.layout_dirty and not node.children_dirty \
+                and x == self.x and width == self.width:
+            if y != self.y:
+                shift_tree(self, y - self.y)
+            if node.paint_dirty or node.children_paint_dirty:
+                self.paint_dirty = True
+                if self.mode == "block":
+                    for child in self.children:
+                        child.layout()
+            return
+        self.x, self.y, self.width = x, y, width
+        self.paint_dirty = True
         
         mode = self.layout_mode()
         if mode == "block":
-            previous = None
-            for child in self.node.children:
-                next = BlockLayout(child, self, previous)
-                self.children.append(next)
-                previous = next
+            # Child blocks are kept unless this node's own children were replaced
+            if self.layout_dirty or node.layout_dirty or self.mode != "block":
+                self.children = []
+                previous = None
+                for child in self.node.children:
+                    next = BlockLayout(child, self, previous)
+                    self.children.append(next)
+                    previous = next
         else:
+            self.children = []
             self.line = []
             self.new_line()
             self.recurse(self.node)
+        self.mode = mode
             
         for child in self.children:
             child.layout()
             
         # calculate height after recursing children
         self.height = sum([child.height for child in self.children])
+        self.layout_dirty = False
 
     def self_rect(self):
         return skia.Rect.MakeLTRB(
@@ -76,15 +107,17 @@ class BlockLayout:
     def paint(self):
         cmds = []
 
-        bgcolor = self.node.style.get("background-color", "transparent")
+        bgcolor = self.node.style.background_color
         
-        if bgcolor != "transparent":
-            radius = float(
-                self.node.style.get("border-radius", "0px")[:-2])
+        if bgcolor is not None:
+            radius = self.node.style.border_radius
             cmds.append(DrawRRect(self.self_rect(), radius, bgcolor))
 
         return cmds
         
+    def caches_paint(self):
+        return self.mode == "inline"
+
     def should_paint(self):
         return isinstance(self.node, Text) or (self.node.tag != "input" and self.node.tag !=  "button")
     
@@ -115,8 +148,7 @@ class BlockLayout:
             
     def recurse(self, node):
         if isinstance(node, Text):
-            for word in node.text.split():
-                self.word(node, word)
+            self.text_run(node)
         else:
             if node.tag == "br":
                 self.new_line()
@@ -140,32 +172,44 @@ class BlockLayout:
         previous_word = line.children[-1] if line.children else None
         input = InputLayout(node, line, previous_word)
         line.children.append(input)
-        weight = node.style["font-weight"]
-        style = node.style["font-style"]
-        size = float(node.style["font-size"][:-2])
-        font = get_font(size, weight, style)
-        self.cursor_x += w + font.measureText(" ")
+        self.cursor_x += w + node.style.metrics.space_width
         
     def font(self, node):
-        weight = node.style["font-weight"]
-        style = node.style["font-style"]
-        if style == "normal": style = "roman"
-        size = float(node.style["font-size"][:-2])
-        return get_font(size, weight, style)
+        return node.style.font
             
-    def word(self, node, word: str):
-        weight = node.style["font-weight"]
-        style = node.style["font-style"]
-        size = float(node.style["font-size"][:-2])
-        font = get_font(size, weight, style)
-        w = font.measureText(word)
-        if self.cursor_x + w > self.width:
-            self.new_line()
-        line = self.children[-1]
-        previous_word = line.children[-1] if line.children else None
-        text = TextLayout(node, word, line, previous_word)
-        line.children.append(text)
-        self.cursor_x += w + font.measureText(" ")
+    def text_run(self, node):
+        """
+        Breaks the words of a Text node into lines. The words are measured in
+        one batch, and the last word that fits on each line is found by binary
+        search over their cumulative positions, so only one TextLayout is made
+        for each line the run touches.
+        """
+        words = node.text.split()
+        if not words: return
+        style = node.style
+        widths = TEXT_METRICS.measure_words(style.font, style.metrics, words)
+        space = style.metrics.space_width
+        # Where each word would start and end if the run were one long line.
+        # Both only grow, so they can be bisected.
+        starts = array("d", accumulate([width + space for width in widths], initial=0.0))
+        ends = array("d", map(add, starts, widths))
+        i = 0
+        while i < len(words):
+            limit = self.width - self.cursor_x + starts[i]
+            if ends[i] > limit:
+                # The next word starts a new line, even if it is too wide for one
+                self.new_line()
+                limit = self.width + starts[i]
+                j = max(bisect_right(ends, limit, i), i + 1)
+            else:
+                j = bisect_right(ends, limit, i)
+            line = self.children[-1]
+            previous = line.children[-1] if line.children else None
+            text = TextLayout(node, " ".join(words[i:j]), line, previous,
+                              ends[j - 1] - starts[i])
+            line.children.append(text)
+            self.cursor_x += starts[j] - starts[i]
+            i = j
         
     def flush(self):
         """
@@ -186,3 +230,14 @@ class BlockLayout:
         
         max_descent = max([metric["descent"] for metric in metrics])
         self.cursor_y = baseline + 1.25 * max_descent
+
+
+def shift_tree(layout_object, dy):
+    """
+    Moves a laid-out subtree down by dy without laying it out or painting it again.
+    """
+    for obj in tree_to_list(layout_object, []):
+        obj.y += dy
+        if isinstance(obj, BlockLayout) and not obj.paint_dirty:
+            for cmd in obj.paint_cache:
+                cmd.shift(dy)
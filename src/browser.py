@@ -8,7 +8,7 @@ import tkinter as tk
 from typing import List
 from htmlparser import HTMLParser
 from document_layout import DocumentLayout
-from cssparser import CSSParser, cascade_priority, style
+from cssparser import cascade_priority, style
 from utils import tree_to_list
 
 import ctypes
@@ -18,9 +18,6 @@ import skia
 from constants import *
 
 
-with open("browser.css") as f:
-    DEFAULT_STYLE_SHEET = CSSParser(f.read()).parse()
-
 class Browser:
     
     def __init__(self) -> None:
@@ -204,9 +201,18 @@ class Browser:
         
     def new_tab(self, url):
         new_tab = Tab(HEIGHT - self.chrome.bottom, self.chrome)
-        new_tab.load(url)
         self.tabs.append(new_tab)
         self.active_tab = new_tab
+        new_tab.load(url)
+        self.raster_chrome()
+        self.raster_tab()
+        self.draw()
+        
+    def show_frame(self, tab):
+        """
+        Puts a frame on screen while the tab is still loading.
+        """
+        if tab != self.active_tab: return
         self.raster_chrome()
         self.raster_tab()
         self.draw()
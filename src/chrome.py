@@ -1,8 +1,8 @@
 from draw import *
 from url import URL
-from text_layout import get_font
 import skia
-from utils import linespace
+from text_metrics import TEXT_METRICS
+from utils import font_metrics, get_font
 
 from constants import WIDTH
 
@@ -14,7 +14,8 @@ class Chrome:
         self.address_bar = ""
         
         self.font = get_font(20, "normal", "roman")
-        self.font_height = linespace(self.font)
+        self.metrics = font_metrics(self.font)
+        self.font_height = self.metrics.linespace
         
         self.padding = 5
         self.tabbar_top = 0
@@ -108,7 +109,7 @@ class Chrome:
                 self.address_bar, self.font, "black"))
             
             # cursor
-            w = self.font.measureText(self.address_bar)
+            w = TEXT_METRICS.measure(self.font, self.metrics, self.address_bar)
             cmds.append(DrawLine(
                 self.address_rect.left() + self.padding + w,
                 self.address_rect.top(),
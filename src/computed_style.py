@@ -0,0 +1,51 @@
+from types import MappingProxyType
+from utils import font_metrics, get_font, parse_color
+
+
+class ComputedStyle:
+    """
+    A node's computed style. The raw property strings are still available as a
+    read-only mapping; the values layout and paint use are parsed once here.
+    Shared between nodes, so it must not be changed after construction.
+    """
+    __slots__ = ("properties", "font_size", "font_weight", "font_slant", "font",
+                 "metrics", "color", "background_color", "border_radius")
+
+    def __init__(self, properties):
+        self.properties = MappingProxyType(properties)
+        self.font_size = parse_px(properties["font-size"])
+        self.font_weight = properties["font-weight"]
+        self.font_slant = "italic" if properties["font-style"] == "italic" else "roman"
+        self.font = get_font(self.font_size, self.font_weight, self.font_slant)
+        self.metrics = font_metrics(self.font)
+        self.color = parse_color(properties["color"])
+        background_color = properties.get("background-color", "transparent")
+        if background_color == "transparent":
+            self.background_color = None
+        else:
+            self.background_color = parse_color(background_color)
+        self.border_radius = parse_px(properties.get("border-radius", "0px"))
+
+    def __getitem__(self, property):
+        return self.properties[property]
+
+    def __contains__(self, property):
+        return property in self.properties
+
+    def get(self, property, default=None):
+        return self.properties.get(property, default)
+
+    def keys(self):
+        return self.properties.keys()
+
+    def items(self):
+        return self.properties.items()
+
+
+def parse_px(value):
+    """
+    Returns the number of pixels in a length like "16px", or 0 for other units.
+    """
+    if value.endswith("px"):
+        return float(value[:-2])
+    return 0.0
@@ -0,0 +1,302 @@
+import socket
+import ssl
+import threading
+import time
+import http2
+
+
+MAX_IDLE_PER_HOST = 6
+IDLE_TIMEOUT = 30.0
+RECV_SIZE = 64 * 1024
+
+
+class SocketReader:
+    """
+    Buffered binary reader over a socket. Headers are cut out of the buffer line by
+    line; body bytes can be received straight into the caller's buffer.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.pos = 0
+        self.received = 0
+
+    def fill(self):
+        data = self.sock.recv(RECV_SIZE)
+        if not data: return False
+        self.received += len(data)
+        if self.pos:
+            del self.buffer[:self.pos]
+            self.pos = 0
+        self.buffer += data
+        return True
+
+    def readline(self):
+        """
+        Returns the next line including its newline, or what is left at EOF.
+        """
+        while True:
+            end = self.buffer.find(b"\n", self.pos)
+            if end >= 0:
+                line = bytes(self.buffer[self.pos:end + 1])
+                self.pos = end + 1
+                return line
+            if not self.fill():
+                line = bytes(self.buffer[self.pos:])
+                self.pos = len(self.buffer)
+                return line
+
+    def read_some(self, size):
+        """
+        Returns up to size bytes with at most one recv; empty only at EOF.
+        """
+        if self.pos < len(self.buffer):
+            data = bytes(self.buffer[self.pos:self.pos + size])
+            self.pos += len(data)
+            return data
+        data = self.sock.recv(size)
+        self.received += len(data)
+        return data
+
+    def read(self, size):
+        """
+        Returns exactly size bytes unless the connection closes first.
+        """
+        out = bytearray(size)
+        view = memoryview(out)
+        pos = 0
+        while pos < size:
+            n = self.readinto(view[pos:])
+            if n == 0: break
+            pos += n
+        view.release()
+        del out[pos:]
+        return out
+
+    def readinto(self, view):
+        """
+        Fills view from the buffer if it holds anything, else with one recv_into.
+        """
+        available = len(self.buffer) - self.pos
+        if available:
+            n = min(available, len(view))
+            view[:n] = self.buffer[self.pos:self.pos + n]
+            self.pos += n
+            return n
+        n = self.sock.recv_into(view)
+        self.received += n
+        return n
+
+
+class Connection:
+    """
+    A socket to one (scheme, host, port) origin that can carry several HTTP/1.1 requests.
+    """
+    def __init__(self, key, sock):
+        self.key = key
+        self.sock = sock
+        self.reader = SocketReader(sock)
+        self.last_used = time.monotonic()
+        self.reused = False
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ConnectionPool:
+    """
+    Keeps idle keep-alive connections around so that later requests to the same
+    origin skip the TCP connect and, for https, the TLS handshake.
+    """
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST, idle_timeout=IDLE_TIMEOUT):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self.idle = {}
+        self.tls_sessions = {}
+        self.ssl_context = ssl.create_default_context()
+        if http2.AVAILABLE:
+            self.ssl_context.set_alpn_protocols(http2.ALPN_PROTOCOLS)
+        # One shared HTTP/2 connection per origin, plus a lock per origin so
+        # concurrent first requests open it only once
+        self.h2 = {}
+        self.h2_origins = set()
+        # https origins whose server chose HTTP/1.1 over ALPN
+        self.http1_origins = set()
+        self.connect_locks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, scheme, host, port, timing=None):
+        """
+        Returns a warm connection to the origin if there is one, else opens a new
+        one, recording DNS, connect and TLS times on timing. Origins that speak
+        HTTP/2 get one shared http2.H2Connection; others get a Connection.
+        """
+        key = (scheme, host, port)
+        if self.may_use_h2(key):
+            with self.connect_lock(key):
+                # The connection opened while this one waited may have shown
+                # that the origin only speaks HTTP/1.1
+                if self.may_use_h2(key):
+                    conn = self.take(key)
+                    if conn: return conn
+                    return self.connect(key, self.tls_sessions.get(key), timing)
+        conn = self.take(key)
+        if conn: return conn
+        return self.connect(key, self.tls_sessions.get(key), timing)
+
+    def take(self, key):
+        """
+        Returns an open HTTP/2 connection or idle HTTP/1.1 connection to reuse, counting
+        the hit or miss.
+        """
+        with self.lock:
+            self.evict_idle(time.monotonic())
+            h2_conn = self.h2.get(key)
+            if h2_conn and h2_conn.is_open():
+                h2_conn.reused = True
+                h2_conn.last_used = time.monotonic()
+                self.hits += 1
+                return h2_conn
+            idle = self.idle.get(key)
+            if idle:
+                conn = idle.pop()
+                conn.reused = True
+                self.hits += 1
+                return conn
+            self.misses += 1
+            return None
+
+    def expects_h2(self, key):
+        scheme, host, port = key
+        return http2.AVAILABLE and \
+            (key in self.h2_origins or (host, port) in http2.PRIOR_KNOWLEDGE)
+
+    def may_use_h2(self, key):
+        """
+        Returns true unless the origin is known not to speak HTTP/2. An https
+        origin may still pick it through ALPN until a connection says otherwise.
+        """
+        return self.expects_h2(key) or (http2.AVAILABLE and key[0] == "https"
+                                        and key not in self.http1_origins)
+
+    def connect_lock(self, key):
+        with self.lock:
+            return self.connect_locks.setdefault(key, threading.Lock())
+
+    def connect(self, key, session=None, timing=None) -> Connection:
+        scheme, host, port = key
+        if timing: timing.dns_start = time.perf_counter()
+        address = socket.getaddrinfo(
+            host, port, socket.AF_INET, socket.SOCK_STREAM)[0][4]
+        if timing: timing.dns_end = timing.connect_start = time.perf_counter()
+        s = socket.socket(
+            family=socket.AF_INET,
+            type=socket.SOCK_STREAM,
+            proto=socket.IPPROTO_TCP,
+        )
+        # Small frames like HTTP/2 window updates must not wait on Nagle's algorithm
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.connect(address)
+        if timing: timing.connect_end = time.perf_counter()
+        
+        if scheme == "http" and self.expects_h2(key):
+            return self.add_h2(key, s)
+
+        # Wrap socket with encryption, resuming an earlier TLS session if we have one
+        if scheme == "https":
+            if timing: timing.tls_start = time.perf_counter()
+            s = self.ssl_context.wrap_socket(
+                s, server_hostname=host, session=session)
+            if timing: timing.tls_end = time.perf_counter()
+            if s.selected_alpn_protocol() == "h2":
+                return self.add_h2(key, s)
+            with self.lock:
+                self.http1_origins.add(key)
+        return Connection(key, s)
+
+    def add_h2(self, key, sock):
+        """
+        Stores a new HTTP/2 connection for the origin and returns it, or closes
+        it and returns the stored one if that is still open.
+        """
+        conn = http2.H2Connection(key, sock)
+        with self.lock:
+            existing = self.h2.get(key)
+            if existing is None or not existing.is_open():
+                self.h2[key] = conn
+                self.h2_origins.add(key)
+                return conn
+        conn.close()
+        return existing
+
+    def save_session(self, conn):
+        """
+        Remembers the TLS session of conn so later connections can resume it.
+        Under TLS 1.3 the session ticket only arrives after the handshake, so
+        this is called once a response has been read.
+        """
+        session = getattr(conn.sock, "session", None)
+        if session is None: return
+        with self.lock:
+            self.tls_sessions[conn.key] = session
+
+    def release(self, conn: Connection):
+        """
+        Hands a connection whose response was fully read back to the pool.
+        """
+        conn.last_used = time.monotonic()
+        with self.lock:
+            idle = self.idle.setdefault(conn.key, [])
+            if len(idle) >= self.max_idle_per_host:
+                conn.close()
+                return
+            idle.append(conn)
+
+    def evict_idle(self, now):
+        """
+        Closes connections that sat idle for longer than the timeout, and drops
+        HTTP/2 connections that are idle or were closed. Caller holds the lock.
+        """
+        for key, conn in list(self.h2.items()):
+            if conn.is_open() and conn.is_idle(now, self.idle_timeout):
+                conn.close()
+            if not conn.is_open():
+                del self.h2[key]
+        for key, idle in list(self.idle.items()):
+            fresh = []
+            for conn in idle:
+                if now - conn.last_used > self.idle_timeout:
+                    conn.close()
+                else:
+                    fresh.append(conn)
+            if fresh:
+                self.idle[key] = fresh
+            else:
+                del self.idle[key]
+
+    def close_all(self):
+        with self.lock:
+            for conn in self.h2.values():
+                conn.close()
+            self.h2 = {}
+            for idle in self.idle.values():
+                for conn in idle:
+                    conn.close()
+            self.idle = {}
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "idle": sum(len(idle) for idle in self.idle.values()),
+                "h2": len(self.h2),
+            }
+
+
+CONNECTION_POOL = ConnectionPool()
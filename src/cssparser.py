@@ -1,5 +1,10 @@
+from types import MappingProxyType
+from ancestor_filter import AncestorFilter
+from computed_style import ComputedStyle
 from element import Element
-from selector import DescendantSelector, TagSelector
+from inline_style_cache import INLINE_STYLE_CACHE
+from selector import DescendantSelector, simple_selector
+from style_sharing import STYLE_SHARING_CACHE
 
 
 INHERITED_PROPERTIES = {
@@ -9,36 +14,80 @@ INHERITED_PROPERTIES = {
     "color": "black",
 }
 
-def style(node, rules):
-    node.style = {}
+def style(node, rules, ancestors=None, context=None):
+    """
+    Computes node.style for node and its subtree. The style is a ComputedStyle,
+    shared with other nodes through STYLE_SHARING_CACHE.
+    """
+    if ancestors is None:
+        ancestors = AncestorFilter.above(node)
+        context = STYLE_SHARING_CACHE.begin(node, rules)
+    parent_style = node.parent.style if node.parent else None
+    if isinstance(node, Element):
+        context = STYLE_SHARING_CACHE.context(context, node)
+        key = (id(parent_style), context, node.attributes.get("style"))
+    else:
+        # Text only inherits from its parent
+        key = (id(parent_style), None, None)
+    shared = STYLE_SHARING_CACHE.lookup(key)
+    if shared is not None:
+        node.style = shared
+    else:
+        node.style = ComputedStyle(compute_style(node, rules, ancestors))
+        STYLE_SHARING_CACHE.store(key, parent_style, node.style)
+            
+    if node.children:
+        ancestors.push(node)
+        for child in node.children:
+            style(child, rules, ancestors, context)
+        ancestors.pop(node)
+
+def compute_style(node, rules, ancestors):
+    computed = {}
     
     for property, default_value in INHERITED_PROPERTIES.items():
         if node.parent:
-            node.style[property] = node.parent.style[property]
+            computed[property] = node.parent.style[property]
         else:
-            node.style[property] = default_value
+            computed[property] = default_value
     
-    for selector, body in rules:
-        if not selector.matches(node): continue
+    for selector, body in rules.matching(node, ancestors):
         for property, value in body.items():
-            node.style[property] = value
+            computed[property] = value
     
     if isinstance(node, Element) and "style" in node.attributes:
-        pairs = CSSParser(node.attributes["style"]).body()
+        pairs = inline_style(node.attributes["style"])
         for property, value in pairs.items():
-            node.style[property] = value
+            computed[property] = value
             
-    if node.style["font-size"].endswith("%"):
+    if computed["font-size"].endswith("%"):
         if node.parent:
-            parent_font_size = node.parent.style["font-size"]
+            parent_px = node.parent.style.font_size
         else:
-            parent_font_size = INHERITED_PROPERTIES["font-size"]
-        node_pct = float(node.style["font-size"][:-1]) / 100
-        parent_px = float(parent_font_size[:-2])
-        node.style["font-size"] = str(node_pct * parent_px) + "px"
-            
-    for child in node.children:
-        style(child, rules)
+            parent_px = float(INHERITED_PROPERTIES["font-size"][:-2])
+        node_pct = float(computed["font-size"][:-1]) / 100
+        computed["font-size"] = str(node_pct * parent_px) + "px"
+    return computed
+
+def inline_style(text):
+    """
+    Returns the read-only declarations of a style attribute, parsed once per
+    distinct text.
+    """
+    pairs = INLINE_STYLE_CACHE.lookup(text)
+    if pairs is None:
+        pairs = INLINE_STYLE_CACHE.store(text, MappingProxyType(CSSParser(text).body()))
+    return pairs
+
+def restyle_dirty(node, rules):
+    """
+    Restyles only the subtrees marked style-dirty since the last render.
+    """
+    if node.style_dirty:
+        style(node, rules)
+    elif node.children_dirty:
+        for child in node.children:
+            restyle_dirty(child, rules)
 
 def cascade_priority(rule):
     selector, body = rule
@@ -123,11 +172,10 @@ class CSSParser:
         return rules
     
     def selector(self):
-        out = TagSelector(self.word().lower())
+        out = simple_selector(self.word())
         self.whitespace()
         while self.i < len(self.s) and self.s[self.i] != "{":
-            tag = self.word()
-            descendant = TagSelector(tag.lower())
+            descendant = simple_selector(self.word())
             out = DescendantSelector(out, descendant)
             self.whitespace()
         return out
@@ -143,4 +191,3 @@ class CSSParser:
             else:
                 self.i += 1
         return None
-
@@ -9,8 +9,10 @@ class DocumentLayout:
         self.children = []
 
     def layout(self):
-        child = BlockLayout(self.node, self, None)
-        self.children.append(child)
+        # Kept across renders so unchanged blocks can reuse their layout
+        if not self.children:
+            self.children.append(BlockLayout(self.node, self, None))
+        child = self.children[0]
         
         self.width = WIDTH - 2 * HSTEP
         self.x = HSTEP
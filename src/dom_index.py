@@ -0,0 +1,103 @@
+from element import Element
+from selector_compiler import SELECTOR_COMPILER
+
+
+class DOMIndex:
+    """
+    Elements by tag name, id and class, kept up to date as the DOM changes so
+    that selector queries only test elements that could match.
+    """
+    def __init__(self):
+        self.by_tag = {}
+        self.by_id = {}
+        self.by_class = {}
+        # While the parser only appends, each bucket is already in document
+        # order. After a subtree is replaced, positions are rebuilt on demand.
+        self.in_order = True
+        self.positions = None
+
+    def add(self, elt):
+        self.by_tag.setdefault(elt.tag, {})[elt] = None
+        if "id" in elt.attributes:
+            self.by_id.setdefault(elt.attributes["id"], {})[elt] = None
+        for name in elt.attributes.get("class", "").split():
+            self.by_class.setdefault(name, {})[elt] = None
+
+    def remove(self, elt):
+        self.by_tag.get(elt.tag, {}).pop(elt, None)
+        if "id" in elt.attributes:
+            self.by_id.get(elt.attributes["id"], {}).pop(elt, None)
+        for name in elt.attributes.get("class", "").split():
+            self.by_class.get(name, {}).pop(elt, None)
+
+    def set_attribute(self, elt, name, value):
+        """
+        Sets an attribute on elt, moving it between buckets if it is an id or
+        class and elt is indexed. Detached elements stay out of the index.
+        """
+        if name not in ["id", "class"] or not self.contains(elt):
+            elt.set_attribute(name, value)
+            return
+        self.remove(elt)
+        elt.set_attribute(name, value)
+        self.add(elt)
+        # elt is now at the end of its buckets
+        self.in_order = False
+
+    def contains(self, elt):
+        return elt in self.by_tag.get(elt.tag, {})
+
+    def add_tree(self, node):
+        for elt in elements(node):
+            self.add(elt)
+        self.in_order = False
+        self.positions = None
+
+    def remove_tree(self, node):
+        for elt in elements(node):
+            self.remove(elt)
+        self.positions = None
+
+    def tagged(self, tag):
+        return self.by_tag.get(tag, {}).keys()
+
+    def with_id(self, id):
+        return self.by_id.get(id, {}).keys()
+
+    def with_class(self, name):
+        return self.by_class.get(name, {}).keys()
+
+    def query(self, selector, root):
+        """
+        Returns the elements under root matching selector, in document order.
+        """
+        match = SELECTOR_COMPILER.get(selector)
+        nodes = [node for node in selector.candidates(self) if match(node)]
+        if self.in_order: return nodes
+        if self.positions is None:
+            self.positions = {elt: i for i, elt in enumerate(elements(root))}
+        # Anything not under root has no position and is left out
+        positions = self.positions
+        return sorted([node for node in nodes if node in positions],
+                      key=positions.__getitem__)
+
+
+def is_connected(node, root):
+    """
+    Returns whether node is root or in the tree under it.
+    """
+    while node is not None:
+        if node is root: return True
+        node = node.parent
+    return False
+
+def elements(node):
+    """
+    Yields the elements in the tree under node, in document order.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Element):
+            yield node
+            stack.extend(reversed(node.children))
@@ -1,5 +1,6 @@
 import skia
-from utils import parse_color
+from text_metrics import TEXT_METRICS
+from utils import font_metrics, parse_color
 
 class DrawLine:
     def __init__(self, x1, y1, x2, y2, color, thickness):
@@ -8,38 +9,49 @@ class DrawLine:
         self.y1 = y1
         self.x2 = x2
         self.y2 = y2
-        self.color = color
+        self.color = parse_color(color)
         self.thickness = thickness
 
     def execute(self, canvas):
         path = skia.Path().moveTo(self.x1, self.y1).lineTo(self.x2, self.y2)
-        paint = skia.Paint(Color=parse_color(self.color))
+        paint = skia.Paint(Color=self.color)
         paint.setStyle(skia.Paint.kStroke_Style)
         paint.setStrokeWidth(self.thickness)
         canvas.drawPath(path, paint)
 
+    def shift(self, dy):
+        self.y1 += dy
+        self.y2 += dy
+        self.rect = skia.Rect.MakeLTRB(self.x1, self.y1, self.x2, self.y2)
+
 class DrawOutline:
     def __init__(self, rect, color, thickness):
         self.rect = rect
-        self.color = color
+        self.color = parse_color(color)
         self.thickness = thickness
 
     def execute(self, canvas):
         paint = skia.Paint()
         paint.setStyle(skia.Paint.kStroke_Style)
         paint.setStrokeWidth(self.thickness)
-        paint.setColor(parse_color(self.color))
+        paint.setColor(self.color)
         canvas.drawRect(self.rect, paint)
 
+    def shift(self, dy):
+        self.rect = self.rect.makeOffset(0, dy)
+
 class DrawRect:
     def __init__(self, rect, color):
         self.rect = rect
-        self.color = color
+        self.color = parse_color(color)
         
     def execute(self, canvas):
         paint = skia.Paint()
-        paint.setColor(parse_color(self.color))
+        paint.setColor(self.color)
         canvas.drawRect(self.rect, paint)
+
+    def shift(self, dy):
+        self.rect = self.rect.makeOffset(0, dy)
     
     def __repr__(self):
         return "DrawRect(top={} left={} bottom={} right={} color={})".format(
@@ -50,25 +62,37 @@ class DrawRRect:
     def __init__(self, rect, radius, color):
         self.rect = rect
         self.rrect = skia.RRect.MakeRectXY(rect, radius, radius)
-        self.color = color
+        self.color = parse_color(color)
 
     def execute(self, canvas):
-        sk_color = parse_color(self.color)
-        canvas.drawRRect(self.rrect, paint=skia.Paint(Color=sk_color))
+        canvas.drawRRect(self.rrect, paint=skia.Paint(Color=self.color))
+
+    def shift(self, dy):
+        self.rect = self.rect.makeOffset(0, dy)
+        self.rrect = self.rrect.makeOffset(0, dy)
         
 class DrawText:
-    def __init__(self, x1, y1, text, font, color):
+    def __init__(self, x1, y1, text, font, color, width=None):
         self.left = x1
         self.top = y1
-        self.right = x1 + font.measureText(text)
-        self.bottom = y1 - font.getMetrics().fAscent + font.getMetrics().fDescent
+        metrics = font_metrics(font)
+        if width is None:
+            width = TEXT_METRICS.measure(font, metrics, text)
+        self.right = x1 + width
+        self.bottom = y1 + metrics.linespace
         self.rect = skia.Rect.MakeLTRB(x1, y1, self.right, self.bottom)
         self.font = font
+        self.ascent = metrics.ascent
         self.text = text
-        self.color = color
+        self.color = parse_color(color)
         
     def execute(self, canvas):
         paint = skia.Paint(
-            AntiAlias=True, Color=parse_color(self.color))
-        baseline = self.top - self.font.getMetrics().fAscent
-        canvas.drawString(self.text, float(self.left), baseline, self.font, paint)
\ No newline at end of file
+            AntiAlias=True, Color=self.color)
+        baseline = self.top - self.ascent
+        canvas.drawString(self.text, float(self.left), baseline, self.font, paint)
+
+    def shift(self, dy):
+        self.top += dy
+        self.bottom += dy
+        self.rect = skia.Rect.MakeLTRB(self.left, self.top, self.right, self.bottom)
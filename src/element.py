@@ -1,15 +1,93 @@
-from dataclasses import dataclass, field
+import sys
+from types import MappingProxyType
+
+# Shared by every element without attributes; set_attribute copies on write
+EMPTY_ATTRIBUTES = MappingProxyType({})
+# Shared by every node without children; append_child replaces it with a list
+NO_CHILDREN = ()
 
-@dataclass
 class Element:
-    tag: str
-    attributes: dict
-    parent: object
-    children: list = field(default_factory=list)
-    is_focused: bool = field(default=False)
-    
-    def __hash__(self) -> int:
-        return id(self)
+    __slots__ = ("tag", "attributes", "parent", "children", "is_focused", "style",
+                 "style_dirty", "layout_dirty", "paint_dirty",
+                 "children_dirty", "children_paint_dirty")
+
+    def __init__(self, tag, attributes, parent):
+        self.tag = sys.intern(tag)
+        self.attributes = attributes or EMPTY_ATTRIBUTES
+        self.parent = parent
+        self.children = NO_CHILDREN
+        self.is_focused = False
+        # What the next render must redo for this element; a new element has
+        # never been styled, laid out or painted
+        self.style_dirty = True
+        self.layout_dirty = True
+        self.paint_dirty = True
+        # Some descendant needs restyle or layout, or only repaint
+        self.children_dirty = False
+        self.children_paint_dirty = False
+
+    def append_child(self, child):
+        if self.children is NO_CHILDREN:
+            self.children = [child]
+        else:
+            self.children.append(child)
+        # This element's children changed. Its ancestors are flagged so that,
+        # when the parser appends after a render, the next render and
+        # clear_dirty reach the new child; the ancestors of a flagged element
+        # are already flagged, so the walk stops at the first one.
+        self.layout_dirty = self.paint_dirty = True
+        node = self
+        while node and not node.children_dirty:
+            node.children_dirty = True
+            node = node.parent
+
+    def set_attribute(self, name, value):
+        if self.attributes is EMPTY_ATTRIBUTES:
+            self.attributes = {}
+        self.attributes[sys.intern(name)] = value
     
+    def mark_style_dirty(self):
+        """
+        Records that this element's style, and so its whole subtree's, must be
+        recomputed, for example because its children were replaced.
+        """
+        self.style_dirty = True
+        self.mark_layout_dirty()
+
+    def mark_layout_dirty(self):
+        """
+        Records that the block containing this element must be laid out again.
+        """
+        self.layout_dirty = True
+        self.paint_dirty = True
+        node = self.parent
+        while node:
+            node.children_dirty = True
+            node = node.parent
+
+    def mark_paint_dirty(self):
+        """
+        Records that this element looks different but takes the same space, as
+        when an input's value or focus changes.
+        """
+        self.paint_dirty = True
+        node = self.parent
+        while node:
+            node.children_paint_dirty = True
+            node = node.parent
+
     def __repr__(self):
-        return "<" + self.tag + ">"
\ No newline at end of file
+        return "<" + self.tag + ">"
+
+
+def clear_dirty(node):
+    """
+    Clears dirty flags under node after a render, visiting only dirty nodes.
+    """
+    if not (node.style_dirty or node.layout_dirty or node.paint_dirty
+            or node.children_dirty or node.children_paint_dirty):
+        return
+    node.style_dirty = node.layout_dirty = node.paint_dirty = False
+    node.children_dirty = node.children_paint_dirty = False
+    for child in node.children:
+        clear_dirty(child)
@@ -1,40 +1,98 @@
+import re
+import sys
+from dom_index import DOMIndex
 from text import Text
 from element import Element
 
-SELF_CLOSING_TAGS = [
+SELF_CLOSING_TAGS = {
     "area", "base", "br", "col", "embed", "hr", "img", "input",
     "link", "meta", "param", "source", "track", "wbr",
-]
+}
 
-HEAD_TAGS = [
+HEAD_TAGS = {
     "base", "basefont", "bgsound", "noscript",
     "link", "meta", "title", "style", "script",
-]
+}
+
+
+# A whole tag from "<" to ">", where quoted attribute values may contain "<" or ">"
+TAG_RE = re.compile(r"""<((?:[^<>"']|"[^"]*"|'[^']*')*)>""")
+# As much of a tag as is there, up to where TAG_RE stopped matching
+TAG_START_RE = re.compile(r"""<(?:[^<>"']|"[^"]*"|'[^']*')*""")
+ATTRIBUTE_RE = re.compile(r"""([^\s=/][^\s=]*)(?:\s*=\s*("[^"]*"|'[^']*'|\S+))?""")
 
 
 class HTMLParser:
-    def __init__(self, body):
+    def __init__(self, body=""):
         self.body = body
         self.unfinished = []
+        self.pending = ""
+        self.text_length = 0
+        self.index = DOMIndex()
 
     def parse(self):
-        text = ""
-        in_tag = False
-        for c in self.body:
-            if c == "<":
-                in_tag = True
-                if text: self.add_text(text)
-                text = ""
-            elif c == ">":
-                in_tag = False
-                self.add_tag(text)
-                text = ""
-            else:
-                text += c
-        if not in_tag and text:
-            self.add_text(text)
+        self.feed(self.body)
+        return self.close()
+
+    def parse_fragment(self, context):
+        """
+        Parses the body as the new children of the context element, the way
+        innerHTML does, without building a whole document around it.
+        """
+        holder = Element(context.tag, context.attributes, context.parent)
+        self.unfinished = [holder]
+        self.feed(self.body)
+        self.close()
+        for child in holder.children:
+            child.parent = context
+        return holder.children
+    
+    def feed(self, chunk):
+        """
+        Parses the next piece of the document, pulling out whole text runs and
+        tags with str.find and a compiled regex. Text or a tag cut off at the end
+        of the chunk is kept until the following chunk completes it.
+        """
+        self.scan(self.pending + chunk, final=False)
+
+    def scan(self, body, final):
+        pos = 0
+        while True:
+            start = body.find("<", pos)
+            if start < 0: break
+            match = TAG_RE.match(body, start)
+            if not match:
+                # Either the tag is not complete yet, or the "<" is stray and what
+                # follows up to the next "<" is text
+                if not final and tag_continues(body, start): break
+                next_start = body.find("<", start + 1)
+                if next_start < 0: break
+                if start > pos: self.add_text(body[pos:start])
+                self.add_text(body[start + 1:next_start])
+                pos = next_start
+                continue
+            if start > pos: self.add_text(body[pos:start])
+            self.add_tag(match.group(1))
+            pos = match.end()
+        self.pending = body[pos:]
+        
+    def close(self):
+        # Tags still waiting for more input never get it
+        pending, self.pending = self.pending, ""
+        self.scan(pending, final=True)
+        # An unterminated tag at the end of the document is dropped
+        if self.pending and not self.pending.startswith("<"):
+            self.add_text(self.pending)
+        self.pending = ""
         return self.finish()
     
+    def root(self):
+        """
+        Returns the document element parsed so far. Open elements are already
+        attached to their parents, so the partial tree can be styled and laid out.
+        """
+        return self.unfinished[0] if self.unfinished else None
+    
     def add_text(self, text):
         # if text is empty space, skip it
         if text.isspace(): return
@@ -44,9 +102,11 @@ class HTMLParser:
         # add text as child to unfinished element
         parent = self.unfinished[-1]
         node = Text(text, parent)
-        parent.children.append(node)
+        parent.append_child(node)
+        self.text_length += len(text)
 
     def add_tag(self, tag):
+        if not tag.strip(): return
         tag, attributes = self.get_attributes(tag)
         if tag.startswith("!"): return
         if tag.startswith("tag") or tag.startswith("/tag"): 
@@ -55,49 +115,51 @@ class HTMLParser:
         self.implicit_tags(tag)
         if tag.startswith("/"):
             if len(self.unfinished) == 1: return
-            node = self.unfinished.pop()
-            parent = self.unfinished[-1]
-            parent.children.append(node)
+            self.unfinished.pop()
         elif tag in SELF_CLOSING_TAGS:
             parent = self.unfinished[-1]
             node = Element(tag, attributes, parent)
-            parent.children.append(node)
+            parent.append_child(node)
+            self.index.add(node)
         else:
             parent = self.unfinished[-1] if self.unfinished else None
             node = Element(tag, attributes, parent)
+            if parent: parent.append_child(node)
+            self.index.add(node)
             self.unfinished.append(node)
             
     def get_attributes(self, text):
-        parts = text.split()
+        parts = text.split(None, 1)
         tag = parts[0].lower()
-        attributes = {}
-        for attrpair in parts[1:]:
-            if "=" in attrpair:
-                key, value = attrpair.split("=", 1)
-                if len(value) > 2 and value[0] in ["'", "\""]:
-                    value = value[1:-1]
-                attributes[key.lower()] = value
-            else:
-                attributes[attrpair.lower()] = ""
+        # <br/> is the same tag as <br>
+        if len(tag) > 1 and tag.endswith("/"):
+            tag = tag[:-1]
+        attributes = parse_attributes(parts[1]) if len(parts) > 1 else {}
         return tag, attributes
         
     def implicit_tags(self, tag):
+        # Only the outermost two open elements matter here, so look at them
+        # directly rather than listing every open tag
+        unfinished = self.unfinished
         while True:
-            open_tags = [node.tag for node in self.unfinished]
+            depth = len(unfinished)
             
             # add implicit <html> tag if first tag is not <html>
-            if open_tags == [] and tag != "html":
+            if depth == 0 and tag != "html":
                 self.add_tag("html")
             
             # add implicit <head> or <body> if missing
-            elif open_tags == ["html"] and tag not in ["head", "body", "/html"]:
+            elif depth == 1 and unfinished[0].tag == "html" \
+                    and tag not in ["head", "body", "/html"]:
                 if tag in HEAD_TAGS:
                     self.add_tag("head")
                 else:
                     self.add_tag("body")
                     
             # add </head> if tag is supposed to go in <body>
-            elif open_tags == ["html", "head"] and tag not in ["/head"] + HEAD_TAGS:
+            elif depth == 2 and unfinished[0].tag == "html" \
+                    and unfinished[1].tag == "head" \
+                    and tag != "/head" and tag not in HEAD_TAGS:
                 self.add_tag("/head")
             
             # exit loop if no other issues
@@ -107,13 +169,32 @@ class HTMLParser:
     def finish(self):
         if len(self.unfinished) == 0:
             self.add_tag("html")
-        while len(self.unfinished) > 1:
-            node = self.unfinished.pop()
-            parent = self.unfinished[-1]
-            parent.children.append(node)
-        return self.unfinished.pop()
+        root = self.unfinished[0]
+        self.unfinished = []
+        return root
     
 def print_tree(node, indent=0):
     print(" " * indent, node)
     for child in node.children:
-        print_tree(child, indent + 2)
\ No newline at end of file
+        print_tree(child, indent + 2)
+
+
+def tag_continues(body, start):
+    """
+    Returns true if the tag at start runs to the end of body without being
+    broken, so more input could still complete it.
+    """
+    end = TAG_START_RE.match(body, start).end()
+    # Stopping at a quote means the quoted value is not closed yet
+    return end == len(body) or body[end] in "'\""
+
+def parse_attributes(text):
+    """
+    Parses the attributes part of a tag; quoted values may contain spaces.
+    """
+    attributes = {}
+    for key, value in ATTRIBUTE_RE.findall(text):
+        if len(value) >= 2 and value[0] in "'\"" and value[-1] == value[0]:
+            value = value[1:-1]
+        attributes[sys.intern(key.lower())] = value
+    return attributes
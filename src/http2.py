@@ -0,0 +1,246 @@
+import queue
+import select
+import ssl
+import threading
+import time
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+except ImportError:
+    h2 = None
+
+
+# HTTP/2 is optional: it is used only when the h2 package is installed
+AVAILABLE = h2 is not None
+ALPN_PROTOCOLS = ["h2", "http/1.1"]
+# (host, port) pairs known to speak cleartext HTTP/2 without an upgrade
+PRIOR_KNOWLEDGE = set()
+RECV_SIZE = 64 * 1024
+POLL_INTERVAL = 0.05
+# The error code of a stream the server reset before doing any work on it
+REFUSED_STREAM = 0x7
+# Headers that only make sense for HTTP/1.x and are forbidden in HTTP/2
+CONNECTION_HEADERS = ["host", "connection", "keep-alive", "transfer-encoding", "upgrade"]
+
+
+class StreamReset(ConnectionError):
+    """
+    The server reset one stream; the connection it was on may still be open.
+    """
+    def __init__(self, error_code):
+        super().__init__(f"HTTP/2 stream reset: {error_code}")
+        self.error_code = error_code
+
+
+class H2Stream:
+    """
+    One request/response exchange on an HTTP/2 connection. The response body is
+    read through the same read_some/readinto/read calls as a SocketReader.
+    """
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.headers = None
+        self.headers_ready = threading.Event()
+        self.chunks = queue.Queue()
+        self.pending = b""
+        self.error = None
+        self.received = 0
+
+    def wait_headers(self):
+        self.headers_ready.wait()
+        if self.error: raise self.error
+        return self.headers
+
+    def fail(self, error):
+        self.error = error
+        self.headers_ready.set()
+        self.chunks.put(error)
+
+    def read_some(self, size):
+        if not self.pending:
+            item = self.chunks.get()
+            if isinstance(item, Exception):
+                self.chunks.put(item)
+                raise item
+            if item is None:
+                # Leave the end marker for any later read
+                self.chunks.put(None)
+                return b""
+            self.pending = item
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def read(self, size):
+        out = bytearray()
+        while len(out) < size:
+            data = self.read_some(size - len(out))
+            if not data: break
+            out += data
+        return out
+
+    def readinto(self, view):
+        data = self.read_some(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+
+class H2Connection:
+    """
+    A multiplexed HTTP/2 connection shared by every request to one origin. A
+    reader thread owns incoming frames and routes them to their streams, so
+    requests from several threads proceed at once.
+    """
+    def __init__(self, key, sock):
+        self.key = key
+        self.sock = sock
+        self.conn = h2.connection.H2Connection(config=h2.config.H2Configuration(
+            client_side=True, header_encoding="utf-8"))
+        self.streams = {}
+        self.closed = False
+        self.reused = False
+        self.last_used = time.monotonic()
+        # Guards the protocol state and all socket I/O
+        self.lock = threading.Lock()
+        self.window_open = threading.Condition(self.lock)
+        with self.lock:
+            self.conn.initiate_connection()
+            self.flush()
+        threading.Thread(target=self.read_loop, daemon=True).start()
+
+    def flush(self):
+        """
+        Writes out frames queued by the protocol state machine. Caller holds the lock.
+        """
+        data = self.conn.data_to_send()
+        if data: self.sock.sendall(data)
+
+    def send_request(self, method, url, headers, payload=None) -> H2Stream:
+        authority = url.host
+        if url.port not in (80, 443): authority += ":" + str(url.port)
+        h2_headers = [
+            (":method", method),
+            (":scheme", url.scheme),
+            (":authority", authority),
+            (":path", url.path),
+        ]
+        for header, value in headers.items():
+            if header.lower() in CONNECTION_HEADERS: continue
+            h2_headers.append((header.lower(), value))
+
+        with self.lock:
+            if self.closed:
+                raise ConnectionError("HTTP/2 connection closed")
+            stream_id = self.conn.get_next_available_stream_id()
+            stream = H2Stream(stream_id)
+            self.streams[stream_id] = stream
+            self.conn.send_headers(stream_id, h2_headers, end_stream=not payload)
+            self.flush()
+        if payload:
+            self.send_body(stream_id, payload.encode("utf8"))
+        return stream
+
+    def send_body(self, stream_id, data):
+        """
+        Sends a request body, waiting whenever the peer's flow control window is full.
+        """
+        with self.lock:
+            while data:
+                window = min(self.conn.local_flow_control_window(stream_id),
+                             self.conn.max_outbound_frame_size)
+                if window <= 0:
+                    self.window_open.wait()
+                    continue
+                chunk, data = data[:window], data[window:]
+                self.conn.send_data(stream_id, chunk, end_stream=not data)
+                self.flush()
+
+    def read_loop(self):
+        while not self.closed:
+            # Poll so that senders get the lock between reads
+            if not self.has_pending():
+                try:
+                    readable, _, _ = select.select([self.sock], [], [], POLL_INTERVAL)
+                except (OSError, ValueError):
+                    readable = [self.sock]
+                if not readable: continue
+            with self.lock:
+                if self.closed: return
+                try:
+                    data = self.sock.recv(RECV_SIZE)
+                except OSError:
+                    data = b""
+                if not data:
+                    self.close_streams(ConnectionError("HTTP/2 connection closed"))
+                    return
+                for event in self.conn.receive_data(data):
+                    self.dispatch(event)
+                self.flush()
+
+    def has_pending(self):
+        """
+        Returns true if TLS already decrypted bytes that select() cannot see.
+        """
+        return isinstance(self.sock, ssl.SSLSocket) and self.sock.pending() > 0
+
+    def dispatch(self, event):
+        """
+        Routes one protocol event to its stream. Caller holds the lock.
+        """
+        stream = self.streams.get(getattr(event, "stream_id", None))
+        if isinstance(event, h2.events.ResponseReceived) and stream:
+            stream.headers = dict(event.headers)
+            stream.headers_ready.set()
+        elif isinstance(event, h2.events.DataReceived):
+            if stream:
+                stream.received += len(event.data)
+                stream.chunks.put(event.data)
+            # Reopen the receive window as soon as the data is queued
+            self.conn.acknowledge_received_data(
+                event.flow_controlled_length, event.stream_id)
+        elif isinstance(event, h2.events.StreamEnded) and stream:
+            stream.chunks.put(None)
+            del self.streams[event.stream_id]
+            self.last_used = time.monotonic()
+        elif isinstance(event, h2.events.StreamReset) and stream:
+            stream.fail(StreamReset(event.error_code))
+            del self.streams[event.stream_id]
+            self.last_used = time.monotonic()
+        elif isinstance(event, (h2.events.WindowUpdated, h2.events.RemoteSettingsChanged)):
+            self.window_open.notify_all()
+        elif isinstance(event, h2.events.ConnectionTerminated):
+            self.close_streams(ConnectionError("HTTP/2 connection terminated"))
+
+    def close_streams(self, error):
+        """
+        Fails every open stream and marks the connection unusable. Caller holds the lock.
+        """
+        self.closed = True
+        for stream in self.streams.values():
+            stream.fail(error)
+        self.streams = {}
+        self.window_open.notify_all()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def is_open(self):
+        return not self.closed
+
+    def is_idle(self, now, timeout):
+        """
+        Returns true if no stream has been open for longer than timeout.
+        """
+        return not self.streams and now - self.last_used > timeout
+
+    def close(self):
+        with self.lock:
+            if self.closed: return
+            try:
+                self.conn.close_connection()
+                self.flush()
+            except OSError:
+                pass
+            self.close_streams(ConnectionError("HTTP/2 connection closed"))
@@ -0,0 +1,165 @@
+import codecs
+import zlib
+
+
+READ_SIZE = 64 * 1024
+ACCEPT_ENCODING = "gzip, deflate"
+DEFAULT_CHARSET = "utf8"
+TEXT_SUBTYPES = ["javascript", "ecmascript", "json", "xml", "css", "html"]
+
+
+class ContentDecoder:
+    """
+    Incrementally undoes a gzip or deflate Content-Encoding as body bytes arrive.
+    """
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            # Chosen once the first two bytes show whether there is a zlib header
+            self.decompressor = None
+        self.pending = b""
+
+    def decompress(self, data):
+        if self.decompressor is None:
+            self.pending += data
+            if len(self.pending) < 2: return b""
+            data, self.pending = self.pending, b""
+            self.decompressor = deflate_decompressor(data)
+        return self.decompressor.decompress(data)
+
+    def flush(self):
+        if self.decompressor is None:
+            data, self.pending = self.pending, b""
+            self.decompressor = deflate_decompressor(data)
+            return self.decompressor.decompress(data) + self.decompressor.flush()
+        return self.decompressor.flush()
+
+
+def deflate_decompressor(start):
+    """
+    Returns a decompressor for a deflate body beginning with start. Some servers
+    send raw deflate without the zlib wrapper, which the header check tells apart.
+    """
+    if len(start) >= 2 and start[0] & 0x0f == 8 and (start[0] << 8 | start[1]) % 31 == 0:
+        return zlib.decompressobj(zlib.MAX_WBITS)
+    return zlib.decompressobj(-zlib.MAX_WBITS)
+
+
+def is_framed(headers):
+    """
+    Returns true if the body's end can be found without the server closing the connection.
+    """
+    return headers.get("transfer-encoding", "").lower() == "chunked" \
+        or "content-length" in headers
+
+
+def text_encoding(headers):
+    """
+    Returns the codec to decode the body with, or None for a binary resource.
+    """
+    content_type = headers.get("content-type", "")
+    mime, _, params = content_type.partition(";")
+    mime = mime.strip().lower()
+    if mime and not mime.startswith("text/") and \
+       not any(subtype in mime for subtype in TEXT_SUBTYPES):
+        return None
+    for param in params.split(";"):
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            try:
+                return codecs.lookup(value.strip().strip('"')).name
+            except LookupError:
+                break
+    return DEFAULT_CHARSET
+
+
+def decode_body(body, headers):
+    """
+    Returns the body as text for text resources and as raw bytes otherwise.
+    """
+    encoding = text_encoding(headers)
+    if encoding is None: return bytes(body)
+    return str(body, encoding, "replace")
+
+def as_text(body):
+    """
+    Returns a body from decode_body as text, decoding a binary one as UTF-8 for
+    callers that can only use text, such as the CSS parser and the JS engine.
+    """
+    if isinstance(body, str): return body
+    return str(body, DEFAULT_CHARSET, "replace")
+
+
+def iter_raw_body(reader, headers):
+    """
+    Yields the body bytes as they arrive, with any chunked framing removed.
+    """
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = reader.readline()
+            size = int(size_line.split(b";", 1)[0].strip(), 16)
+            if size == 0: break
+            yield reader.read(size)
+            reader.readline()
+        # Skip trailers up to the blank line ending the message
+        while reader.readline() not in (b"\r\n", b"\n", b""): pass
+    elif "content-length" in headers:
+        remaining = int(headers["content-length"])
+        while remaining > 0:
+            data = reader.read_some(min(remaining, READ_SIZE))
+            if not data: break
+            remaining -= len(data)
+            yield data
+    else:
+        while True:
+            data = reader.read_some(READ_SIZE)
+            if not data: break
+            yield data
+
+
+def read_body(reader, headers, on_data=None):
+    """
+    Reads the whole decoded body into a single bytearray, calling on_data with each
+    new piece. An uncompressed body with a Content-Length is received straight into
+    a preallocated buffer without intermediate copies.
+    """
+    encoding = headers.get("content-encoding", "identity").lower()
+    chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+    if encoding == "identity" and not chunked and "content-length" in headers:
+        length = int(headers["content-length"])
+        body = bytearray(length)
+        view = memoryview(body)
+        pos = 0
+        while pos < length:
+            n = reader.readinto(view[pos:])
+            if n == 0: break
+            if on_data: on_data(view[pos:pos + n])
+            pos += n
+        view.release()
+        if pos < length: del body[pos:]
+        return body
+    
+    body = bytearray()
+    for data in iter_body(reader, headers):
+        body += data
+        if on_data: on_data(data)
+    return body
+
+
+def iter_body(reader, headers):
+    """
+    Yields decoded body bytes chunk by chunk, so callers never need the encoded body whole.
+    """
+    encoding = headers.get("content-encoding", "identity").lower()
+    if encoding not in ("gzip", "deflate"):
+        assert encoding == "identity", f"Unsupported content encoding {encoding}"
+        yield from iter_raw_body(reader, headers)
+        return
+    decoder = ContentDecoder(encoding)
+    for data in iter_raw_body(reader, headers):
+        out = decoder.decompress(data)
+        if out: yield out
+    out = decoder.flush()
+    if out: yield out
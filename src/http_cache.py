@@ -0,0 +1,251 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+MEMORY_CACHE_BYTES = 8 * 1024 * 1024
+DISK_CACHE_BYTES = 64 * 1024 * 1024
+DISK_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "weblite")
+INDEX_FILE = "index.json"
+
+
+def parse_cache_control(value):
+    """
+    Splits a Cache-Control header into a dict of lowercased directives.
+    """
+    directives = {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part: continue
+        if "=" in part:
+            name, arg = part.split("=", 1)
+            directives[name.strip().lower()] = arg.strip().strip('"')
+        else:
+            directives[part.lower()] = None
+    return directives
+
+
+class CacheEntry:
+    def __init__(self, headers, body, stored_at, max_age):
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at
+        self.max_age = max_age
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    def is_fresh(self, now):
+        return now - self.stored_at < self.max_age
+
+    def validators(self):
+        """
+        Returns the conditional request headers that revalidate this entry.
+        """
+        headers = {}
+        if "etag" in self.headers:
+            headers["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+
+def freshness_lifetime(headers):
+    """
+    Returns how many seconds a response may be served without revalidation,
+    or None if it must not be stored at all.
+    """
+    directives = parse_cache_control(headers.get("cache-control", ""))
+    if "no-store" in directives:
+        return None
+    lifetime = 0
+    if "no-cache" not in directives and "max-age" in directives:
+        try:
+            lifetime = max(int(directives["max-age"]), 0)
+        except ValueError:
+            lifetime = 0
+    if "age" in headers:
+        try:
+            lifetime = max(lifetime - int(headers["age"]), 0)
+        except ValueError:
+            pass
+    # Without a lifetime or a validator the entry could never be reused
+    if lifetime == 0 and "etag" not in headers and "last-modified" not in headers:
+        return None
+    return lifetime
+
+
+class HTTPCache:
+    """
+    Two-tier HTTP cache: a size-bounded LRU in memory in front of an on-disk store
+    described by an index file. Entries are keyed by absolute URL.
+    """
+    def __init__(self, memory_limit=MEMORY_CACHE_BYTES, disk_limit=DISK_CACHE_BYTES,
+                 directory=DISK_CACHE_DIR):
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.directory = directory
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.index = None
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.bytes_saved = 0
+
+    def lookup(self, key):
+        """
+        Returns the stored entry for key, fresh or stale, or None.
+        """
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry:
+                self.memory.move_to_end(key)
+                return entry
+            entry = self.read_disk(key)
+            if entry:
+                self.remember(key, entry)
+            return entry
+
+    def record_hit(self, entry):
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += entry.size
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def store(self, key, headers, body):
+        """
+        Stores a response if its headers allow it. body is kept as it is, not
+        copied, so the caller must not change it afterwards.
+        """
+        lifetime = freshness_lifetime(headers)
+        if lifetime is None:
+            self.remove(key)
+            return
+        entry = CacheEntry(headers, body, time.time(), lifetime)
+        with self.lock:
+            self.remember(key, entry)
+            self.write_disk(key, entry)
+
+    def revalidated(self, key, entry, headers):
+        """
+        Refreshes a stale entry after a 304 Not Modified and returns it.
+        """
+        merged = dict(entry.headers)
+        merged.update(headers)
+        lifetime = freshness_lifetime(merged)
+        fresh = CacheEntry(merged, entry.body, time.time(), lifetime or 0)
+        with self.lock:
+            self.revalidations += 1
+            self.bytes_saved += fresh.size
+            self.remember(key, fresh)
+            self.write_disk(key, fresh)
+        return fresh
+
+    def remove(self, key):
+        with self.lock:
+            entry = self.memory.pop(key, None)
+            if entry: self.memory_bytes -= entry.size
+            self.delete_disk(key)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "bytes_saved": self.bytes_saved,
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.index) if self.index else 0,
+            }
+
+    # The methods below expect the caller to hold the lock.
+
+    def remember(self, key, entry):
+        old = self.memory.pop(key, None)
+        if old: self.memory_bytes -= old.size
+        if entry.size > self.memory_limit: return
+        self.memory[key] = entry
+        self.memory_bytes += entry.size
+        while self.memory_bytes > self.memory_limit:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= evicted.size
+
+    def load_index(self):
+        if self.index is not None: return
+        self.index = OrderedDict()
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                self.index.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        self.disk_bytes = sum(record["size"] for record in self.index.values())
+
+    def save_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.replace(path + ".tmp", path)
+
+    def body_path(self, key):
+        name = hashlib.sha1(key.encode("utf8")).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def read_disk(self, key):
+        self.load_index()
+        record = self.index.get(key)
+        if not record: return None
+        try:
+            with open(self.body_path(key), "rb") as f:
+                body = f.read()
+        except OSError:
+            self.disk_bytes -= self.index.pop(key)["size"]
+            return None
+        self.index.move_to_end(key)
+        return CacheEntry(record["headers"], body, record["stored_at"], record["max_age"])
+
+    def write_disk(self, key, entry):
+        self.load_index()
+        if entry.size > self.disk_limit: return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.body_path(key), "wb") as f:
+                f.write(entry.body)
+            old = self.index.pop(key, None)
+            if old: self.disk_bytes -= old["size"]
+            self.index[key] = {
+                "headers": entry.headers,
+                "stored_at": entry.stored_at,
+                "max_age": entry.max_age,
+                "size": entry.size,
+            }
+            self.disk_bytes += entry.size
+            while self.disk_bytes > self.disk_limit:
+                evicted, record = self.index.popitem(last=False)
+                self.disk_bytes -= record["size"]
+                os.remove(self.body_path(evicted))
+            self.save_index()
+        except OSError:
+            pass
+
+    def delete_disk(self, key):
+        self.load_index()
+        if key not in self.index: return
+        self.disk_bytes -= self.index.pop(key)["size"]
+        try:
+            os.remove(self.body_path(key))
+            self.save_index()
+        except OSError:
+            pass
+
+
+HTTP_CACHE = HTTPCache()
@@ -0,0 +1,9 @@
+from lru import LRUCache
+
+
+MAX_INLINE_STYLES = 1024
+
+# Parsed style attributes keyed by their text, shared by every node and
+# render. When a script changes an element's style attribute, its next
+# restyle simply looks up the new text.
+INLINE_STYLE_CACHE = LRUCache(MAX_INLINE_STYLES)
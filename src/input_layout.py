@@ -1,6 +1,7 @@
 from draw import DrawLine, DrawRRect, DrawRect, DrawText
 from text import Text
-from utils import get_font, linespace
+from text_metrics import TEXT_METRICS
+from utils import font_metrics, get_font
 import skia
 
 
@@ -17,23 +18,22 @@ class InputLayout:
         self.width = None
         self.height = None
         self.font = None
+        self.metrics = None
         
     def layout(self):
-        weight = self.node.style["font-weight"]
-        style = self.node.style["font-style"]
-        if style == "normal": style = "roman"
-        size = int(float(self.node.style["font-size"][:-2]))
-        self.font = get_font(size, weight, style)
+        style = self.node.style
+        self.font = get_font(int(style.font_size), style.font_weight, style.font_slant)
+        self.metrics = font_metrics(self.font)
         
         self.width = INPUT_WIDTH_PX
 
         if self.previous:
-            space = self.previous.font.measureText(" ")
+            space = self.previous.metrics.space_width
             self.x = self.previous.x + space + self.previous.width
         else:
             self.x = self.parent.x
 
-        self.height = linespace(self.font)
+        self.height = self.metrics.linespace
         
     def self_rect(self):
         return skia.Rect.MakeLTRB(
@@ -47,9 +47,9 @@ class InputLayout:
         cmds = []
         
         # Draw background
-        bgcolor = self.node.style.get("background-color","transparent")
-        if bgcolor != "transparent":
-            radius = float(self.node.style.get("border-radius", "0px")[:-2])
+        bgcolor = self.node.style.background_color
+        if bgcolor is not None:
+            radius = self.node.style.border_radius
             cmds.append(DrawRRect(self.self_rect(), radius, bgcolor))
 
         # Get the input element's text contents
@@ -64,13 +64,13 @@ class InputLayout:
                 text = ""
 
         # Draw text
-        color = self.node.style["color"]
+        color = self.node.style.color
         cmds.append(
             DrawText(self.x, self.y, text, self.font, color))
 
         # If input element is focused, draw cursor
         if self.node.is_focused:
-            cx = self.x + self.font.measureText(text)
+            cx = self.x + TEXT_METRICS.measure(self.font, self.metrics, text)
             cmds.append(DrawLine(cx, self.y, cx, self.y + self.height, "black", 1))
         
         return cmds
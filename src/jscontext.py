@@ -1,10 +1,12 @@
 import dukpy
 from cssparser import CSSParser
+from dom_index import is_connected
 from element import Element
 from htmlparser import HTMLParser
+from resource_timing import ResourceTiming
 from tasks import Task
-from utils import tree_to_list
 import threading
+import time
 
 
 RUNTIME_JS = open("runtime.js").read()
@@ -18,14 +20,19 @@ class JSContext:
         self.node_to_handle = {}
         self.handle_to_node = {}
         self.discarded = False
+        self.suspended = False
+        self.pending_timeouts = []
         
         self.interp = dukpy.JSInterpreter()
         self.interp.export_function("log", print)
         self.interp.export_function("querySelectorAll", self.querySelectorAll)
         self.interp.export_function("getAttribute", self.getAttribute)
+        self.interp.export_function("setAttribute", self.setAttribute)
         self.interp.export_function("innerHTML_set", self.innerHTML_set)
         self.interp.export_function("XMLHttpRequest_send", self.XMLHttpRequest_send)
         self.interp.export_function("setTimeout", self.setTimeout)
+        self.interp.export_function("performance_getEntries", self.performance_getEntries)
+        self.interp.export_function("performance_now", self.performance_now)
         self.interp.evaljs(RUNTIME_JS)
 
     def run(self, script, code):
@@ -36,8 +43,7 @@ class JSContext:
 
     def querySelectorAll(self, selector_text):
         selector = CSSParser(selector_text).selector()
-        
-        nodes = [node for node in tree_to_list(self.tab.nodes, []) if selector.matches(node)]
+        nodes = self.tab.dom_index.query(selector, self.tab.nodes)
         return [self.get_handle(node) for node in nodes]
     
     def get_handle(self, elt):
@@ -53,18 +59,36 @@ class JSContext:
         elt = self.handle_to_node[handle]
         return elt.attributes.get(attr, None)
     
+    def setAttribute(self, handle, attr, value):
+        elt = self.handle_to_node[handle]
+        attr = attr.lower()
+        self.tab.dom_index.set_attribute(elt, attr, value)
+        if attr in ["style", "id", "class"]:
+            elt.mark_style_dirty()
+        else:
+            elt.mark_paint_dirty()
+        self.tab.render()
+    
     def dispatch_event(self, type, elt):
         handle = self.node_to_handle.get(elt, -1)
         do_default = self.interp.evaljs(EVENT_DISPATCH_JS, type=type, handle=handle)
         return not do_default
         
     def innerHTML_set(self, handle, s):
-        doc = HTMLParser("<html><body>" + s + "</body></html>").parse()
-        new_nodes = doc.children[0].children
         elt: Element = self.handle_to_node[handle]
-        elt.children = new_nodes
+        new_nodes = HTMLParser(s).parse_fragment(elt)
+        # Only elements in the document are indexed, so a detached subtree
+        # is neither unindexed nor indexed
+        connected = is_connected(elt, self.tab.nodes)
         for child in elt.children:
-            child.parent = elt
+            if connected:
+                self.tab.dom_index.remove_tree(child)
+            child.parent = None
+        elt.children = new_nodes
+        if connected:
+            for child in elt.children:
+                self.tab.dom_index.add_tree(child)
+        elt.mark_style_dirty()
         self.tab.render()
 
     def XMLHttpRequest_send(self, method, url, body):
@@ -73,13 +97,39 @@ class JSContext:
             raise Exception("Cross-origin XHR blocked by CSP")
         if full_url.origin() != self.tab.url.origin():
             raise Exception("Cross-origin XHR request not allowed")
-        headers, out = full_url.request(self.tab.url, body)
+        timing = ResourceTiming(full_url, "xmlhttprequest", method)
+        self.tab.resource_timings.append(timing)
+        headers, out = full_url.request(self.tab.url, body, timing=timing)
+        if isinstance(out, bytes):
+            out = out.decode("utf8", "replace")
         return out
     
+    def performance_getEntries(self):
+        return self.tab.performance_entries()
+    
+    def performance_now(self):
+        return (time.perf_counter() - self.tab.load_start) * 1000
+    
     def dispatch_settimeout(self, handle):
         if self.discarded: return
+        if self.suspended:
+            self.pending_timeouts.append(handle)
+            return
         self.interp.evaljs(SETTIMEOUT_CODE, handle=handle)
         
+    def suspend(self):
+        """
+        Holds back timer callbacks while the page sits in the back/forward cache.
+        """
+        self.suspended = True
+        
+    def resume(self):
+        self.suspended = False
+        for handle in self.pending_timeouts:
+            task = Task(self.dispatch_settimeout, handle)
+            self.tab.task_runner.schedule_task(task)
+        self.pending_timeouts = []
+        
     def setTimeout(self, handle, time):
         def run_callback():
             task = Task(self.dispatch_settimeout, handle)
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Entries bounded to max_entries, evicting the least recently used, with
+    counts of hits and misses. The caches of parsed and computed results are
+    built on it.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        """
+        Returns the value stored for key, or None, counting the hit or miss.
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def store(self, key, value):
+        """
+        Stores value for key, evicting the oldest entries over the bound, and
+        returns value.
+        """
+        self.entries[key] = value
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": hit_rate(self.hits, self.misses),
+            "entries": len(self.entries),
+        }
+
+
+def hit_rate(hits, misses):
+    lookups = hits + misses
+    return hits / lookups if lookups else 0.0
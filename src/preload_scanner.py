@@ -0,0 +1,36 @@
+import re
+from htmlparser import parse_attributes
+
+
+TAG_RE = re.compile(r"<(link|script)(\s[^>]*)?>", re.IGNORECASE)
+
+
+class PreloadScanner:
+    """
+    Finds stylesheet and script URLs in raw HTML as it streams in, without
+    building a DOM, so their fetches can start before parsing finishes.
+    """
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, chunk):
+        """
+        Returns a list of (initiator, url) pairs for tags completed by this chunk.
+        """
+        text = self.pending + chunk
+        found = []
+        end = 0
+        for match in TAG_RE.finditer(text):
+            end = match.end()
+            tag = match.group(1).lower()
+            attributes = parse_attributes(match.group(2) or "")
+            if tag == "link" and "href" in attributes \
+               and attributes.get("rel") == "stylesheet":
+                found.append(("link", attributes["href"]))
+            elif tag == "script" and "src" in attributes:
+                found.append(("script", attributes["src"]))
+        # Keep a tag cut off by the end of the chunk for the next call
+        start = text.rfind("<", end)
+        self.pending = text[start:] if start >= 0 and ">" not in text[start:] else ""
+        return found
+
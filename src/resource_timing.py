@@ -0,0 +1,148 @@
+from datetime import datetime, timezone
+import json
+import time
+
+
+class ResourceTiming:
+    """
+    Phase timestamps and sizes for one network request. Timestamps come from
+    time.perf_counter(); phases that did not happen (a reused connection has no
+    DNS, connect or TLS) stay None.
+    """
+    def __init__(self, url, initiator, method="GET"):
+        self.url = str(url)
+        self.initiator = initiator
+        self.method = method
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.dns_start = self.dns_end = None
+        self.connect_start = self.connect_end = None
+        self.tls_start = self.tls_end = None
+        self.request_start = self.request_end = None
+        self.response_start = self.response_end = None
+        self.status = 0
+        self.status_text = ""
+        self.http_version = "HTTP/1.1"
+        self.request_headers = {}
+        self.response_headers = {}
+        self.request_bytes = 0
+        self.headers_bytes = 0
+        self.transfer_bytes = 0
+        self.decoded_bytes = 0
+        self.from_cache = False
+
+    def finish(self, body_length):
+        self.response_end = time.perf_counter()
+        if self.response_start is None:
+            self.response_start = self.response_end
+        self.decoded_bytes = body_length
+
+    def to_entry(self, time_origin):
+        """
+        Returns a dict shaped like a PerformanceResourceTiming entry, with times in
+        milliseconds relative to time_origin.
+        """
+        def ms(t):
+            return round((t - time_origin) * 1000, 3) if t is not None else 0
+        end = self.response_end or time.perf_counter()
+        return {
+            "name": self.url,
+            "entryType": "resource",
+            "initiatorType": self.initiator,
+            "startTime": ms(self.start),
+            "duration": round((end - self.start) * 1000, 3),
+            "domainLookupStart": ms(self.dns_start),
+            "domainLookupEnd": ms(self.dns_end),
+            "connectStart": ms(self.connect_start),
+            "connectEnd": ms(self.tls_end or self.connect_end),
+            "secureConnectionStart": ms(self.tls_start),
+            "requestStart": ms(self.request_start),
+            "responseStart": ms(self.response_start),
+            "responseEnd": ms(self.response_end),
+            "transferSize": self.transfer_bytes,
+            "encodedBodySize": max(self.transfer_bytes - self.headers_bytes, 0),
+            "decodedBodySize": self.decoded_bytes,
+        }
+
+    def har_timings(self):
+        def span(start, end):
+            if start is None or end is None: return -1
+            return round((end - start) * 1000, 3)
+        first = self.dns_start or self.connect_start or self.request_start
+        return {
+            "blocked": span(self.start, first),
+            "dns": span(self.dns_start, self.dns_end),
+            "connect": span(self.connect_start, self.tls_end or self.connect_end),
+            "ssl": span(self.tls_start, self.tls_end),
+            "send": max(span(self.request_start, self.request_end), 0),
+            "wait": max(span(self.request_end, self.response_start), 0),
+            "receive": max(span(self.response_start, self.response_end), 0),
+        }
+
+    def to_har(self, pageref):
+        timings = self.har_timings()
+        started = datetime.fromtimestamp(self.wall_start, timezone.utc)
+        return {
+            "pageref": pageref,
+            "startedDateTime": started.isoformat(),
+            "time": sum(t for t in timings.values() if t > 0),
+            "request": {
+                "method": self.method,
+                "url": self.url,
+                "httpVersion": self.http_version,
+                "headers": har_headers(self.request_headers),
+                "queryString": [],
+                "cookies": [],
+                "headersSize": -1,
+                "bodySize": self.request_bytes,
+            },
+            "response": {
+                "status": self.status,
+                "statusText": self.status_text,
+                "httpVersion": self.http_version,
+                "headers": har_headers(self.response_headers),
+                "cookies": [],
+                "content": {
+                    "size": self.decoded_bytes,
+                    "mimeType": self.response_headers.get("content-type", ""),
+                },
+                "redirectURL": "",
+                "headersSize": self.headers_bytes if not self.from_cache else -1,
+                "bodySize": max(self.transfer_bytes - self.headers_bytes, 0),
+            },
+            "cache": {},
+            "timings": timings,
+            "_initiator": self.initiator,
+            "_fromCache": self.from_cache,
+        }
+
+
+def har_headers(headers):
+    return [{"name": name, "value": value} for name, value in headers.items()]
+
+
+def export_har(path, page_url, timings, time_origin, wall_origin):
+    """
+    Writes a HAR 1.2 file with one page and an entry for each ResourceTiming.
+    """
+    started = datetime.fromtimestamp(wall_origin, timezone.utc)
+    har = {
+        "log": {
+            "version": "1.2",
+            "creator": {"name": "WebLite", "version": "0.1"},
+            "pages": [{
+                "id": "page_1",
+                "title": str(page_url),
+                "startedDateTime": started.isoformat(),
+                "pageTimings": {},
+            }],
+            "entries": [timing.to_har("page_1")
+                        for timing in sorted(timings, key=lambda t: t.start)],
+        }
+    }
+    if timings:
+        end = max(t.response_end or t.start for t in timings)
+        har["log"]["pages"][0]["pageTimings"]["onLoad"] = \
+            round((end - time_origin) * 1000, 3)
+    with open(path, "w") as f:
+        json.dump(har, f, indent=2)
@@ -0,0 +1,90 @@
+from heapq import merge
+from element import Element
+from selector import ClassSelector, DescendantSelector, IdSelector, TagSelector
+from selector_compiler import SELECTOR_COMPILER
+
+
+class RuleSet:
+    """
+    Stylesheet rules bucketed by the tag, id or class of their rightmost simple
+    selector, so each node is only tested against rules that could match it.
+    Every bucket is kept in cascade order: priority, then source order, and
+    holds each rule's compiled matching function.
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.by_tag = {}
+        self.by_id = {}
+        self.by_class = {}
+        # Rules whose key selector is none of the above
+        self.universal = []
+        # Every tag, "#id" and ".class" some selector mentions
+        self.used_keys = set()
+        for order, (selector, body) in enumerate(self.rules):
+            self.used_keys.update(selector_keys(selector))
+            match = SELECTOR_COMPILER.get(selector)
+            entry = (selector.priority, order, selector, body, match)
+            key = key_selector(selector)
+            if isinstance(key, TagSelector):
+                self.by_tag.setdefault(key.tag, []).append(entry)
+            elif isinstance(key, IdSelector):
+                self.by_id.setdefault(key.id, []).append(entry)
+            elif isinstance(key, ClassSelector):
+                self.by_class.setdefault(key.name, []).append(entry)
+            else:
+                self.universal.append(entry)
+        for buckets in [self.by_tag, self.by_id, self.by_class]:
+            for bucket in buckets.values():
+                bucket.sort(key=cascade_order)
+        self.universal.sort(key=cascade_order)
+
+    def candidates(self, node):
+        """
+        Returns the rules that might match node, as (selector, body) pairs in
+        cascade order.
+        """
+        return [(selector, body) for _, _, selector, body, _ in self.entries(node)]
+
+    def entries(self, node):
+        """
+        Returns the bucket entries for the rules that might match node, in
+        cascade order.
+        """
+        if not isinstance(node, Element): return []
+        buckets = [self.universal, self.by_tag.get(node.tag, [])]
+        attributes = node.attributes
+        if "id" in attributes:
+            buckets.append(self.by_id.get(attributes["id"], []))
+        if "class" in attributes:
+            for name in attributes["class"].split():
+                buckets.append(self.by_class.get(name, []))
+        buckets = [bucket for bucket in buckets if bucket]
+        if len(buckets) == 1:
+            return buckets[0]
+        return merge(*buckets, key=cascade_order)
+
+    def matching(self, node, ancestors=None):
+        """
+        Returns the rules that match node, in cascade order. ancestors is an
+        optional AncestorFilter for node.
+        """
+        return [(selector, body) for _, _, selector, body, match in self.entries(node)
+                if match(node, ancestors)]
+
+
+def key_selector(selector):
+    """
+    Returns the rightmost simple selector, which the matched node itself must match.
+    """
+    while isinstance(selector, DescendantSelector):
+        selector = selector.descendant
+    return selector
+
+def selector_keys(selector):
+    if isinstance(selector, DescendantSelector):
+        return selector_keys(selector.ancestor) + selector_keys(selector.descendant)
+    return [selector.filter_key]
+
+def cascade_order(entry):
+    priority, order = entry[0], entry[1]
+    return priority, order
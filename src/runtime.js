@@ -3,6 +3,13 @@ console = { log: function(x) { call_python("log", x); } }
 document = { querySelectorAll: function(s) { var handles = call_python("querySelectorAll", s);
                                              return handles.map(function(h) { return new Node(h) }); } }
 
+performance = { getEntries: function() { return call_python("performance_getEntries"); },
+                now: function() { return call_python("performance_now"); } }
+
+performance.getEntriesByType = function(type) {
+    return performance.getEntries().filter(function(e) { return e.entryType == type; });
+}
+
 function Node(handle) { this.handle = handle; }
 
 function Event(type) {
@@ -18,6 +25,10 @@ Node.prototype.getAttribute = function(attr) {
     return call_python("getAttribute", this.handle, attr);
 }
 
+Node.prototype.setAttribute = function(attr, value) {
+    call_python("setAttribute", this.handle, attr, value.toString());
+}
+
 LISTENERS = {}
 
 Node.prototype.addEventListener = function(type, listener) {
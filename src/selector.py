@@ -1,3 +1,4 @@
+from ancestor_filter import filter_slots
 from element import Element
 
 
@@ -5,25 +6,85 @@ class TagSelector:
     def __init__(self, tag):
         self.tag = tag
         self.priority = 1
+        self.filter_key = tag
+        self.text = tag
         
-    def matches(self, node) -> bool:
+    def matches(self, node, ancestors=None) -> bool:
         """
         Returns true if node matches TagSelector object's tag. Else returns false.
         """
         return isinstance(node, Element) and self.tag == node.tag
 
+    def candidates(self, index):
+        return index.tagged(self.tag)
+
+class IdSelector:
+    def __init__(self, id):
+        self.id = id
+        self.priority = 100
+        self.filter_key = "#" + id
+        self.text = self.filter_key
+
+    def matches(self, node, ancestors=None) -> bool:
+        return isinstance(node, Element) and node.attributes.get("id") == self.id
+
+    def candidates(self, index):
+        return index.with_id(self.id)
+
+class ClassSelector:
+    def __init__(self, name):
+        self.name = name
+        self.priority = 10
+        self.filter_key = "." + name
+        self.text = self.filter_key
+
+    def matches(self, node, ancestors=None) -> bool:
+        return isinstance(node, Element) and \
+            self.name in node.attributes.get("class", "").split()
+
+    def candidates(self, index):
+        return index.with_class(self.name)
+
 class DescendantSelector:
     def __init__(self, ancestor, descendant):
         self.ancestor = ancestor
         self.descendant = descendant
         self.priority = ancestor.priority + descendant.priority
+        self.text = ancestor.text + " " + descendant.text
+        # Every simple selector left of the rightmost one names an ancestor
+        self.ancestor_slots = []
+        while isinstance(ancestor, DescendantSelector):
+            self.ancestor_slots.append(filter_slots(ancestor.descendant.filter_key))
+            ancestor = ancestor.ancestor
+        self.ancestor_slots.append(filter_slots(ancestor.filter_key))
         
-    def matches(self, node):
+    def matches(self, node, ancestors=None):
         """
-        Recursively travels through tag ancestors until matching to a tag.
+        Recursively travels through tag ancestors until matching to a tag. When
+        given the AncestorFilter for node, first rejects selectors naming a tag,
+        id or class that no ancestor has.
         """
         if not self.descendant.matches(node): return False
+        if ancestors is not None and not ancestors.may_contain_all(self.ancestor_slots):
+            return False
         while node.parent:
             if self.ancestor.matches(node.parent): return True
             node = node.parent
-        return False
\ No newline at end of file
+        return False
+
+    def candidates(self, index):
+        """
+        Only elements matching the rightmost part can match the whole selector.
+        """
+        return self.descendant.candidates(index)
+
+
+def simple_selector(word):
+    """
+    Returns the selector for one word of selector text: #id, .class or a tag.
+    """
+    if word.startswith("#") and len(word) > 1:
+        return IdSelector(word[1:])
+    if word.startswith(".") and len(word) > 1:
+        return ClassSelector(word[1:])
+    return TagSelector(word.lower())
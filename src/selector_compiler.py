@@ -0,0 +1,85 @@
+import threading
+from element import Element
+from lru import LRUCache
+from selector import ClassSelector, DescendantSelector, IdSelector, TagSelector
+
+
+MAX_COMPILED_SELECTORS = 4096
+
+
+class SelectorCompiler(LRUCache):
+    """
+    Process-wide LRU of matching functions compiled from selectors, keyed by
+    selector text, so a selector used by many rules, sheets or queries is
+    compiled once.
+    """
+    def __init__(self, max_entries=MAX_COMPILED_SELECTORS):
+        super().__init__(max_entries)
+        self.lock = threading.Lock()
+
+    def get(self, selector):
+        """
+        Returns a function match(node, ancestors=None) that gives the same
+        answer as selector.matches.
+        """
+        key = selector.text
+        with self.lock:
+            match = self.lookup(key)
+        if match is not None: return match
+        match = compile_selector(selector)
+        with self.lock:
+            return self.store(key, match)
+
+
+def compile_selector(selector):
+    """
+    Generates one Python function for the whole selector chain: the test for
+    each simple selector is written out inline, and each ancestor is found by
+    a plain loop up the parent pointers instead of nested matches() calls.
+    """
+    slots = getattr(selector, "ancestor_slots", None)
+    parts = []
+    while isinstance(selector, DescendantSelector):
+        parts.append(selector.descendant)
+        selector = selector.ancestor
+    parts.append(selector)
+    # parts is now rightmost first, the order the chain is walked in
+    names = {"Element": Element}
+    lines = [
+        "def match(node, ancestors=None):",
+        "    if node.__class__ is not Element: return False",
+        f"    if not ({simple_test(parts[0])}): return False",
+    ]
+    if len(parts) > 1:
+        names["SLOTS"] = slots
+        lines.append("    if ancestors is not None and "
+                     "not ancestors.may_contain_all(SLOTS): return False")
+    for part in parts[1:]:
+        # Matching each ancestor at the nearest possible place leaves the
+        # most room for the ones further out, so no backtracking is needed
+        lines += [
+            "    node = node.parent",
+            "    while node is not None:",
+            f"        if {simple_test(part)}: break",
+            "        node = node.parent",
+            "    else:",
+            "        return False",
+        ]
+    lines.append("    return True")
+    exec("\n".join(lines), names)
+    return names["match"]
+
+def simple_test(selector):
+    """
+    Returns a Python expression testing node against a simple selector.
+    """
+    if isinstance(selector, TagSelector):
+        return f"node.tag == {selector.tag!r}"
+    if isinstance(selector, IdSelector):
+        return f"node.attributes.get('id') == {selector.id!r}"
+    if isinstance(selector, ClassSelector):
+        return f"{selector.name!r} in node.attributes.get('class', '').split()"
+    raise ValueError(f"cannot compile selector {selector!r}")
+
+
+SELECTOR_COMPILER = SelectorCompiler()
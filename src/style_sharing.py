@@ -0,0 +1,71 @@
+from lru import LRUCache
+
+
+MAX_SHARED_STYLES = 512
+
+
+class StyleSharingCache(LRUCache):
+    """
+    Recently computed styles, shared between elements that are certain to end
+    up with the same one: siblings and cousins whose parents have the same
+    style object, whose own tag, id, classes and inline style agree, and whose
+    ancestors agree on every tag, id and class the style sheets mention.
+
+    Matching context is tracked as a small integer per chain of ancestors, so
+    comparing whole ancestor chains is one lookup. Contexts and entries are
+    only valid for one styling pass and are cleared by begin().
+    """
+    def __init__(self, max_entries=MAX_SHARED_STYLES):
+        super().__init__(max_entries)
+        self.contexts = {}
+        self.used_keys = frozenset()
+
+    def begin(self, node, rules):
+        """
+        Starts a styling pass for the subtree at node. Returns the matching
+        context of node's parent.
+        """
+        self.entries.clear()
+        self.contexts.clear()
+        self.used_keys = rules.used_keys
+        ancestors = []
+        parent = node.parent
+        while parent:
+            ancestors.append(parent)
+            parent = parent.parent
+        context = None
+        for ancestor in reversed(ancestors):
+            context = self.context(context, ancestor)
+        return context
+
+    def context(self, parent_context, elt):
+        """
+        Returns the matching context of elt, given its parent's.
+        """
+        used_keys = self.used_keys
+        attributes = elt.attributes
+        id = attributes.get("id")
+        if id is not None and "#" + id not in used_keys:
+            id = None
+        classes = ()
+        if "class" in attributes:
+            classes = tuple(name for name in attributes["class"].split()
+                            if "." + name in used_keys)
+        key = (parent_context, elt.tag, id, classes)
+        context = self.contexts.get(key)
+        if context is None:
+            context = self.contexts[key] = len(self.contexts)
+        return context
+
+    def lookup(self, key):
+        entry = super().lookup(key)
+        if entry is None: return None
+        _, style = entry
+        return style
+
+    def store(self, key, parent_style, style):
+        # Keep the parent style alive, since the key holds its id()
+        super().store(key, (parent_style, style))
+
+
+STYLE_SHARING_CACHE = StyleSharingCache()
@@ -0,0 +1,67 @@
+import hashlib
+import threading
+from types import MappingProxyType
+from cssparser import CSSParser
+from lru import LRUCache
+from rule_set import RuleSet
+
+
+MAX_STYLE_SHEETS = 64
+MAX_RULE_SETS = 16
+
+
+class StyleSheet:
+    """
+    The parsed rules of one style sheet. Shared between tabs, so neither the
+    rule tuple nor the declaration mappings may be changed.
+    """
+    def __init__(self, key, rules):
+        self.key = key
+        self.rules = tuple((selector, MappingProxyType(body)) for selector, body in rules)
+
+
+class StyleSheetCache:
+    """
+    Process-wide LRU of parsed style sheets keyed by URL and a hash of the
+    text, plus the RuleSets compiled from lists of them, so a sheet used by
+    many pages and tabs is parsed and bucketed once.
+    """
+    def __init__(self, max_sheets=MAX_STYLE_SHEETS, max_rule_sets=MAX_RULE_SETS):
+        self.sheets = LRUCache(max_sheets)
+        self.rule_sets = LRUCache(max_rule_sets)
+        self.lock = threading.Lock()
+
+    def get(self, url, text):
+        """
+        Returns the StyleSheet for text loaded from url, parsing it only if this
+        exact text has not been seen at that URL recently.
+        """
+        key = (str(url), hashlib.sha1(text.encode("utf8")).hexdigest())
+        with self.lock:
+            sheet = self.sheets.lookup(key)
+        if sheet: return sheet
+        sheet = StyleSheet(key, CSSParser(text).parse())
+        with self.lock:
+            return self.sheets.store(key, sheet)
+
+    def rule_set(self, sheets):
+        """
+        Returns the RuleSet for the rules of sheets, in order.
+        """
+        key = tuple(sheet.key for sheet in sheets)
+        with self.lock:
+            rule_set = self.rule_sets.lookup(key)
+        if rule_set: return rule_set
+        rule_set = RuleSet([rule for sheet in sheets for rule in sheet.rules])
+        with self.lock:
+            return self.rule_sets.store(key, rule_set)
+
+    def stats(self):
+        with self.lock:
+            stats = self.sheets.stats()
+            stats["sheets"] = stats.pop("entries")
+            stats["rule_sets"] = len(self.rule_sets.entries)
+        return stats
+
+
+STYLE_SHEET_CACHE = StyleSheetCache()
@@ -1,12 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
 import urllib.parse
-from cssparser import CSSParser, cascade_priority, style
+from bfcache import BackForwardCache, CachedPage
+from cssparser import restyle_dirty
 from document_layout import DocumentLayout
-from element import Element
+from element import Element, clear_dirty
+from http_body import as_text
 from htmlparser import HTMLParser
 from jscontext import JSContext
 from text import Text
 from url import URL
 from utils import paint_tree, tree_to_list
+from preload_scanner import PreloadScanner
+from resource_timing import ResourceTiming, export_har
+from style_sheet_cache import STYLE_SHEET_CACHE
 from tasks import Task, TaskRunner
 import dukpy
 
@@ -14,7 +21,11 @@ from constants import *
 
 
 with open("browser.css") as f:
-    DEFAULT_STYLE_SHEET = CSSParser(f.read()).parse()
+    DEFAULT_STYLE_SHEET = STYLE_SHEET_CACHE.get("browser.css", f.read())
+DEFAULT_RULE_SET = STYLE_SHEET_CACHE.rule_set([DEFAULT_STYLE_SHEET])
+
+MAX_FETCH_WORKERS = 6
+FETCH_POOL = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS)
 
 class Tab:
     def __init__(self, tab_height, chrome):
@@ -23,7 +34,9 @@ class Tab:
         self.history = []
         self.focus = None
         self.js = None
+        self.document = None
         self.task_runner = TaskRunner(self)
+        self.bfcache = BackForwardCache()
     
     def scrollup(self) -> None:
         self.scroll = max(self.scroll - SCROLL_STEP, 0)
@@ -58,9 +71,11 @@ class Tab:
                 if self.js.dispatch_event("click", elt): return
                 if self.focus:
                     self.focus.is_focused = False
+                    self.focus.mark_paint_dirty()
                 self.focus = elt
                 elt.is_focused = True
-                elt.attributes["value"] = ""
+                elt.set_attribute("value", "")
+                elt.mark_paint_dirty()
                 return self.render()
             elif elt.tag == "button":
                 if self.js.dispatch_event("click", elt): return
@@ -74,7 +89,9 @@ class Tab:
     def keypress(self, char):
         if self.focus:
             if self.js.dispatch_event("keydown", self.focus): return
-            self.focus.attributes["value"] += char
+            self.focus.set_attribute(
+                "value", self.focus.attributes["value"] + char)
+            self.focus.mark_paint_dirty()
             self.render()
             
     def backspace(self):
@@ -82,7 +99,8 @@ class Tab:
             if self.js.dispatch_event("keydown", self.focus): return
             curr_text = self.focus.attributes["value"]
             if len(curr_text) > 0:
-                self.focus.attributes["value"] = curr_text[:-1]
+                self.focus.set_attribute("value", curr_text[:-1])
+                self.focus.mark_paint_dirty()
             self.render()
             
     def submit_form(self, elt):
@@ -107,77 +125,167 @@ class Tab:
         if len(self.history) > 1:
             self.history.pop()
             back = self.history.pop()
-            self.load(back)    
+            self.leave_page(cache=False)
+            page = self.bfcache.take(back)
+            if page:
+                self.restore_page(back, page)
+            else:
+                self.load(back)
+            
+    def leave_page(self, cache):
+        """
+        Suspends the current page into the back/forward cache, or discards it.
+        """
+        if not self.js: return
+        if self.focus:
+            self.focus.is_focused = False
+            self.focus.mark_paint_dirty()
+            self.focus = None
+        if cache:
+            self.js.suspend()
+            self.bfcache.store(self.url, CachedPage(self))
+        else:
+            self.js.discarded = True
+        self.js = None
+        
+    def restore_page(self, url, page):
+        self.url = url
+        self.history.append(url)
+        self.nodes = page.nodes
+        self.dom_index = page.dom_index
+        self.style_sheets = page.style_sheets
+        self.rule_set = page.rule_set
+        self.document = page.document
+        self.display_list = page.display_list
+        self.scroll = page.scroll
+        self.allowed_origins = page.allowed_origins
+        self.js = page.js
+        self.load_start = page.load_start
+        self.wall_start = page.wall_start
+        self.load_timing = page.load_timing
+        self.resource_timings = page.resource_timings
+        self.js.resume()
+        self.set_address_bar(url)
             
     def load(self, url: URL, payload=None) -> None:
+        self.leave_page(cache=True)
+        self.load_start = load_start = time.perf_counter()
+        self.load_timing = {}
+        self.resource_timings = []
+        self.wall_start = time.time()
         self.url = url
         self.scroll = 0
         self.history.append(url)
         
-        # Parse HTML
-        headers, body = url.request(self.url, payload)
-        self.nodes = HTMLParser(body).parse()
-        
-        # Extract and Parse Content-Security-Policy header
+        # Parse HTML as it streams in, painting once the first screenful is ready.
+        # The preload scanner starts subresource fetches from the raw text first.
+        parser = HTMLParser()
+        scanner = PreloadScanner()
+        self.preloads = {}
+        first_screen = (WIDTH // HSTEP) * (self.tab_height // VSTEP)
+        self.style_sheets = [DEFAULT_STYLE_SHEET]
+        self.rule_set = DEFAULT_RULE_SET
+        self.painted = False
         self.allowed_origins = None
-        if "content-security-policy" in headers:
-            csp = headers["content-security-policy"].split()
-            if len(csp) > 0 and csp[0] == "default-src":
-                self.allowed_origins = []
-                for origin in csp[1:]:
-                    self.allowed_origins.append(URL(origin).origin())
+        def on_chunk(text):
+            for initiator, link in scanner.feed(text):
+                try:
+                    self.preload(url.resolve(link), initiator)
+                except (AssertionError, ValueError):
+                    pass
+            parser.feed(text)
+            if not self.painted and parser.text_length >= first_screen:
+                self.nodes = parser.root()
+                self.dom_index = parser.index
+                self.first_paint()
+        timing = ResourceTiming(url, "document")
+        self.resource_timings.append(timing)
+        headers, body = url.request(
+            self.url, payload, on_chunk, timing, on_headers=self.set_csp)
+        self.load_timing["document"] = time.perf_counter() - load_start
+        self.nodes = parser.close()
+        self.dom_index = parser.index
         
-        # Parse CSS
-        self.rules = DEFAULT_STYLE_SHEET.copy()
         links = [node.attributes["href"]
-                for node in tree_to_list(self.nodes, [])
-                if isinstance(node, Element)
-                and node.tag == "link"
-                and "href" in node.attributes
+                for node in self.dom_index.tagged("link")
+                if "href" in node.attributes
                 and node.attributes.get("rel") == "stylesheet"]
-
+        scripts = [node.attributes["src"] 
+                   for node in self.dom_index.tagged("script")
+                   if "src" in node.attributes]
+        
+        # Request every stylesheet and script the preload scanner did not already
+        # start, so the fetch stage costs about as much as the slowest resource
+        fetch_start = time.perf_counter()
+        style_fetches = []
         for link in links:
             style_url = url.resolve(link)
             if not self.allowed_request(style_url):
                 print(style_url)
                 print(f"Blocked script {link} due to CSP")
                 continue
-            try:
-                header, body = style_url.request(url)
-            except:
-                continue
-            self.rules.extend(CSSParser(body).parse())
+            style_fetches.append((style_url, self.preload(style_url, "link")))
             
-        # Parse Javascript
-        scripts = [node.attributes["src"] 
-                   for node in tree_to_list(self.nodes, [])
-                   if isinstance(node, Element)
-                   and node.tag == "script"
-                   and "src" in node.attributes]
-        
-        if self.js: self.js.discarded = True
-        self.js = JSContext(self)
+        script_fetches = []
         for script in scripts:
             script_url = url.resolve(script)
             if not self.allowed_request(script_url):
                 print(f"Blocked script {script} due to CSP")
                 continue
-            header, body = script_url.request(url)
-            task = Task(self.js.run, script_url, body)
+            script_fetches.append((script_url, self.preload(script_url, "script")))
+        
+        # Parse CSS in document order
+        for style_url, future in style_fetches:
+            try:
+                header, body = future.result()
+            except:
+                continue
+            self.style_sheets.append(STYLE_SHEET_CACHE.get(style_url, as_text(body)))
+        self.rule_set = STYLE_SHEET_CACHE.rule_set(self.style_sheets)
+        self.nodes.mark_style_dirty()
+            
+        # Queue Javascript in document order
+        self.js = JSContext(self)
+        for script_url, future in script_fetches:
+            header, body = future.result()
+            task = Task(self.js.run, script_url, as_text(body))
             self.task_runner.schedule_task(task)
+        
+        self.load_timing["subresources"] = time.perf_counter() - fetch_start
+        self.load_timing["total"] = time.perf_counter() - load_start
     
+        self.set_address_bar(url)
+        self.render()
+        
+    def set_address_bar(self, url):
         if (url.host == "localhost" or url.host == "127.0.0.1"):
             self.chrome.address_bar = f"{url.scheme}://{url.host}:{url.port}{url.path}"
         else:
             self.chrome.address_bar = f"{url.scheme}://{url.host}{url.path}"
+        
+    def first_paint(self):
+        """
+        Shows a frame of the partially parsed document, styled with the default
+        style sheet only, before subresources are fetched.
+        """
+        self.painted = True
+        self.load_timing["first_paint"] = time.perf_counter() - self.load_start
         self.render()
+        self.chrome.browser.show_frame(self)
         
     def render(self):
-        style(self.nodes, sorted(self.rules, key=cascade_priority))
+        """
+        Brings style, layout and the display list up to date, redoing only what
+        the nodes' dirty bits say changed since the last render.
+        """
+        restyle_dirty(self.nodes, self.rule_set)
         
-        # Load HTML Tree into Layout Tree
-        self.document = DocumentLayout(self.nodes)
+        # Keep the layout tree while the document is the same, so clean blocks
+        # are reused
+        if self.document is None or self.document.node is not self.nodes:
+            self.document = DocumentLayout(self.nodes)
         self.document.layout()
+        clear_dirty(self.nodes)
         self.display_list = []
         paint_tree(self.document, self.display_list)
             
@@ -192,5 +300,46 @@ class Tab:
         for cmd in self.display_list:
             cmd.execute(canvas)
             
+    def fetch(self, url: URL, initiator):
+        """
+        Requests a subresource on the fetch pool. Returns a future for (headers, body).
+        """
+        timing = ResourceTiming(url, initiator)
+        self.resource_timings.append(timing)
+        return FETCH_POOL.submit(url.request, self.url, None, None, timing)
+    
+    def preload(self, url: URL, initiator):
+        """
+        Returns the fetch already started for url during this load, or starts one.
+        Returns None if CSP forbids the request.
+        """
+        if not self.allowed_request(url): return None
+        key = str(url)
+        if key not in self.preloads:
+            self.preloads[key] = self.fetch(url, initiator)
+        return self.preloads[key]
+    
+    def set_csp(self, headers):
+        """
+        Extracts and parses the Content-Security-Policy header.
+        """
+        self.allowed_origins = None
+        if "content-security-policy" in headers:
+            csp = headers["content-security-policy"].split()
+            if len(csp) > 0 and csp[0] == "default-src":
+                self.allowed_origins = []
+                for origin in csp[1:]:
+                    self.allowed_origins.append(URL(origin).origin())
+    
+    def performance_entries(self):
+        return [timing.to_entry(self.load_start) for timing in self.resource_timings]
+    
+    def export_har(self, path):
+        """
+        Writes the requests made for the current page to path as a HAR file.
+        """
+        export_har(path, self.url, self.resource_timings,
+                   self.load_start, self.wall_start)
+            
     def allowed_request(self, url: URL):
         return self.allowed_origins == None or url.origin() in self.allowed_origins
\ No newline at end of file
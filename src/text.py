@@ -1,11 +1,17 @@
-from dataclasses import dataclass, field
+from element import NO_CHILDREN
 
-@dataclass
 class Text:
-    text: str
-    parent: object
-    children: list = field(default_factory=list)
-    is_focused: bool = field(default=False)
+    __slots__ = ("text", "parent", "is_focused", "style")
+    # Text nodes never have children, and changes to them are recorded on
+    # their parent element, so they are never dirty themselves
+    children = NO_CHILDREN
+    style_dirty = layout_dirty = paint_dirty = False
+    children_dirty = children_paint_dirty = False
+
+    def __init__(self, text, parent):
+        self.text = text
+        self.parent = parent
+        self.is_focused = False
     
     def __repr__(self):
-        return repr(self.text)
\ No newline at end of file
+        return repr(self.text)
@@ -1,4 +1,3 @@
-from utils import get_font, linespace
 from draw import DrawText
 
 
@@ -27,11 +26,11 @@ class LineLayout:
             self.height = 0
             return
             
-        max_ascent = max([-word.font.getMetrics().fAscent for word in self.children])
+        max_ascent = max([-word.metrics.ascent for word in self.children])
         baseline = self.y + 1.25 * max_ascent
         for word in self.children:
-            word.y = baseline + word.font.getMetrics().fAscent
-        max_descent = max([word.font.getMetrics().fDescent for word in self.children])
+            word.y = baseline + word.metrics.ascent
+        max_descent = max([word.metrics.descent for word in self.children])
         
         self.height = 1.25 * (max_ascent + max_descent)
         
@@ -43,35 +42,34 @@ class LineLayout:
 
 
 class TextLayout:
-    def __init__(self, node, word, parent, previous):
+    """
+    A run of words from one Text node on one line, already measured by
+    BlockLayout.
+    """
+    def __init__(self, node, text, parent, previous, width):
         self.node = node
-        self.word = word
+        self.text = text
+        self.width = width
         self.children = []
         self.parent = parent
         self.previous = previous
         
     def layout(self):
-        weight = self.node.style["font-weight"]
-        style = self.node.style["font-style"]
-        if style == "normal": style = "roman"
-        # size = int(float(self.node.style["font-size"][:-2]) * .75)
-        size = float(self.node.style["font-size"][:-2])
-        self.font = get_font(size, weight, style)
-        
-        self.width = self.font.measureText(self.word)
+        self.font = self.node.style.font
+        self.metrics = self.node.style.metrics
 
         if self.previous:
-            space = self.previous.font.measureText(" ")
+            space = self.previous.metrics.space_width
             self.x = self.previous.x + space + self.previous.width
         else:
             self.x = self.parent.x
 
-        self.height = linespace(self.font)
+        self.height = self.metrics.linespace
         
     def paint(self):
         cmds = []
-        color = self.node.style["color"]
-        cmds.append(DrawText(self.x, self.y, self.word, self.font, color))
+        color = self.node.style.color
+        cmds.append(DrawText(self.x, self.y, self.text, self.font, color, self.width))
         return cmds
     
     def paint_effects(self, cmds):
@@ -0,0 +1,80 @@
+from array import array
+from itertools import accumulate
+from lru import LRUCache
+
+
+MAX_WORD_WIDTHS = 65536
+
+
+class FontMetrics:
+    """
+    The measurements of one font that layout needs for every word, read from
+    Skia once. ascent is negative, as in Skia.
+    """
+    __slots__ = ("key", "ascent", "descent", "linespace", "space_width")
+
+    def __init__(self, font):
+        self.key = (font.getTypeface().uniqueID(), font.getSize())
+        metrics = font.getMetrics()
+        self.ascent = metrics.fAscent
+        self.descent = metrics.fDescent
+        self.linespace = metrics.fDescent - metrics.fAscent
+        self.space_width = font.measureText(" ")
+
+
+class TextMetricsCache(LRUCache):
+    """
+    Word widths keyed by (typeface, size, word) in a bounded LRU. Shared by
+    all layout and draw objects, so each distinct word is measured by Skia
+    once however many times it is laid out or painted.
+    """
+    def __init__(self, max_entries=MAX_WORD_WIDTHS):
+        super().__init__(max_entries)
+
+    def measure(self, font, metrics, word):
+        """
+        Returns the width of word in font, whose FontMetrics are metrics.
+        """
+        key = (metrics.key, word)
+        width = self.lookup(key)
+        if width is None:
+            width = self.store(key, font.measureText(word))
+        return width
+
+    def measure_words(self, font, metrics, words):
+        """
+        Returns the widths of a run of words in font as an array. Words not in
+        the cache are measured together, with one Skia call for the widths of
+        all their glyphs.
+        """
+        entries = self.entries
+        font_key = metrics.key
+        widths = array("d")
+        missing = []
+        # lookup() inlined, as this runs for every word laid out
+        for i, word in enumerate(words):
+            key = (font_key, word)
+            width = entries.get(key)
+            if width is None:
+                missing.append(i)
+                width = 0.0
+            else:
+                entries.move_to_end(key)
+            widths.append(width)
+        self.hits += len(words) - len(missing)
+        if not missing: return widths
+        self.misses += len(missing)
+        # Skia maps each code point to one glyph, so a word's width is the sum
+        # of the glyph widths over its characters
+        text = "".join([words[i] for i in missing])
+        glyph_widths = font.getWidths(font.textToGlyphs(text))
+        offsets = array("d", accumulate(glyph_widths, initial=0.0))
+        start = 0
+        for i in missing:
+            end = start + len(words[i])
+            widths[i] = self.store((font_key, words[i]), offsets[end] - offsets[start])
+            start = end
+        return widths
+
+
+TEXT_METRICS = TextMetricsCache()
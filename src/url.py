@@ -1,5 +1,10 @@
-import socket
-import ssl
+import codecs
+from http.client import responses as HTTP_REASONS
+import time
+from connection import CONNECTION_POOL
+from http_body import ACCEPT_ENCODING, decode_body, is_framed, read_body, text_encoding
+from http_cache import HTTP_CACHE
+from http2 import REFUSED_STREAM, H2Connection, StreamReset
 from text import Text
 from element import Element
 
@@ -36,24 +41,40 @@ class URL:
             self.port = int(port)
 
         
-    def request(self, top_level_url, payload=None):
-        # Connect to the host
-        s = socket.socket(
-            family=socket.AF_INET,
-            type=socket.SOCK_STREAM,
-            proto=socket.IPPROTO_TCP,
-        )
-        s.connect((self.host, self.port))
-        
-        # Wrap socket with encryption
-        if self.scheme == "https":
-            ctx = ssl.create_default_context()
-            s = ctx.wrap_socket(s, server_hostname=self.host)
-        
+    def request(self, top_level_url, payload=None, on_chunk=None, timing=None,
+                on_headers=None):
+        """
+        Fetches the resource and returns (headers, body). The body is text decoded
+        with the Content-Type charset, or bytes for non-text resources. If on_chunk
+        is given it is also called with each piece of decoded text as it arrives.
+        Phase times and sizes are recorded on timing, a ResourceTiming, if given.
+        on_headers, if given, is called with the response headers before the body.
+        """
         # Decide between GET and POST request
         method = "POST" if payload else "GET"
         
-        body = f"{method} {self.path} HTTP/1.0\r\n"
+        # Serve fresh GET responses from the HTTP cache, revalidate stale ones
+        cache_key = str(self) if method == "GET" else None
+        cached = HTTP_CACHE.lookup(cache_key) if cache_key else None
+        if cached and cached.is_fresh(time.time()):
+            HTTP_CACHE.record_hit(cached)
+            body = decode_body(cached.body, cached.headers)
+            if on_headers: on_headers(cached.headers)
+            if on_chunk and isinstance(body, str): on_chunk(body)
+            if timing:
+                timing.from_cache = True
+                timing.status, timing.status_text = 200, "OK"
+                timing.response_headers = cached.headers
+                timing.finish(cached.size)
+            return cached.headers, body
+        
+        request_headers = {
+            "Host": self.host,
+            "Connection": "keep-alive",
+            "Accept-Encoding": ACCEPT_ENCODING,
+        }
+        if cached:
+            request_headers.update(cached.validators())
         
         # Send cookie to site
         if self.host in COOKIE_JAR:
@@ -63,30 +84,60 @@ class URL:
                 if method != "GET":
                     allow_cookie = self.host == top_level_url.host
             if allow_cookie:
-                body += f"Cookie: {cookie}\r\n"
+                request_headers["Cookie"] = cookie
         
         if payload:
             length = len(payload.encode("utf8"))
-            body += f"Content-Length: {length}\r\n"
-            body += "\r\n" + (payload if payload else "")
-        else:
-            body += f"Host: {self.host}\r\n\r\n"
-        
-        s.send(body.encode("utf8"))
+            request_headers["Content-Length"] = str(length)
         
-        # Read and interpret response from host
-        response = s.makefile("r", encoding="utf8", newline="\r\n")
-        statusline = response.readline()
-        version, status, explanation = statusline.split(" ", 2)
-        assert status == "200", f"{status}: {explanation}"
+        body = f"{method} {self.path} HTTP/1.1\r\n"
+        for header, value in request_headers.items():
+            body += f"{header}: {value}\r\n"
+        body += "\r\n" + (payload if payload else "")
+        if timing:
+            timing.method = method
+            timing.request_headers = request_headers
+            timing.request_bytes = len(payload.encode("utf8")) if payload else 0
         
-        # Map headers
-        response_headers = {}
+        # Send over a pooled connection. A reused connection may have been closed
+        # by the server while idle, in which case we retry on another one.
+        refused = False
         while True:
-            line = response.readline()
-            if line == "\r\n": break
-            header, value = line.split(":", 1)
-            response_headers[header.lower()] = value.strip()
+            conn = CONNECTION_POOL.acquire(
+                self.scheme, self.host, self.port, timing)
+            multiplexed = isinstance(conn, H2Connection)
+            try:
+                if multiplexed:
+                    received = 0
+                    response = self.send_h2(conn, method, request_headers, payload, timing)
+                else:
+                    received = conn.reader.received
+                    response = self.send_http1(conn, body, timing)
+            except StreamReset as e:
+                # A refused stream was never processed, so it is safe to send
+                # once more; any other reset is the caller's to handle
+                if e.error_code == REFUSED_STREAM and not refused:
+                    refused = True
+                    continue
+                raise
+            except OSError:
+                if not multiplexed: conn.close()
+                if conn.reused and not (multiplexed and conn.is_open()): continue
+                raise
+            if not response:
+                conn.close()
+                if conn.reused: continue
+                raise ConnectionError("Connection closed before a response")
+            break
+        
+        # Interpret response from host
+        reader, version, status, explanation, response_headers = response
+        if timing:
+            timing.http_version = version
+            timing.status, timing.status_text = int(status), explanation.strip()
+        not_modified = cached is not None and status == "304"
+        if status != "200" and not not_modified and not multiplexed: conn.close()
+        assert status == "200" or not_modified, f"{status}: {explanation}"
             
         # Update cookies if told to
         if "set-cookie" in response_headers:
@@ -102,13 +153,93 @@ class URL:
                     params[param.casefold()] = value.casefold()
             COOKIE_JAR[self.host] = (cookie, params)
         
-        # Check if unique headers are not present
-        assert "transfer-encoding" not in response_headers
-        assert "content-encoding" not in response_headers
+        # Only a response with a known length leaves the connection reusable
+        keep_alive = version == "HTTP/1.1" and \
+            response_headers.get("connection", "").lower() != "close"
+        if not_modified:
+            # A 304 never has a body; answer with the stored one
+            entry = HTTP_CACHE.revalidated(cache_key, cached, response_headers)
+            response_headers, body = entry.headers, entry.body
+            if on_headers: on_headers(response_headers)
+            decoded = decode_body(body, response_headers)
+            if on_chunk and isinstance(decoded, str): on_chunk(decoded)
+        else:
+            if on_headers: on_headers(response_headers)
+            # Undo chunking and compression as the bytes arrive, handing text to
+            # on_chunk as soon as it decodes
+            encoding = text_encoding(response_headers)
+            on_data = None
+            if on_chunk and encoding:
+                decoder = codecs.getincrementaldecoder(encoding)("replace")
+                on_data = lambda data: on_chunk(decoder.decode(data))
+            body = read_body(reader, response_headers, on_data)
+            if on_data: on_chunk(decoder.decode(b"", final=True))
+            keep_alive = keep_alive and is_framed(response_headers)
+            decoded = decode_body(body, response_headers)
+        
+        if timing:
+            timing.response_headers = response_headers
+            timing.transfer_bytes = reader.received - received
+            timing.finish(len(body))
+        
+        CONNECTION_POOL.save_session(conn)
+        # HTTP/2 connections stay shared in the pool; streams need no release
+        if multiplexed:
+            pass
+        elif keep_alive:
+            CONNECTION_POOL.release(conn)
+        else:
+            conn.close()
+        
+        if cache_key and not not_modified:
+            HTTP_CACHE.record_miss()
+            # Keep the bytes already copied for a binary body, or else the
+            # buffer that was read into, which nothing else holds on to
+            stored = decoded if isinstance(decoded, bytes) else body
+            HTTP_CACHE.store(cache_key, response_headers, stored)
+        return response_headers, decoded
+    
+    def send_http1(self, conn, request, timing):
+        """
+        Writes an HTTP/1.1 request and reads the status line and headers. Returns
+        (reader, version, status, explanation, headers), or None if the server had
+        already closed the connection.
+        """
+        reader = conn.reader
+        if timing: timing.request_start = time.perf_counter()
+        conn.sock.sendall(request.encode("utf8"))
+        if timing: timing.request_end = time.perf_counter()
+        received = reader.received
+        statusline = reader.readline().decode("latin-1")
+        if timing: timing.response_start = time.perf_counter()
+        if not statusline: return None
+        version, status, explanation = statusline.split(" ", 2)
         
-        body = response.read()
-        s.close()
-        return response_headers, body
+        # Map headers
+        response_headers = {}
+        while True:
+            line = reader.readline().decode("latin-1")
+            if line in ("\r\n", "\n", ""): break
+            header, value = line.split(":", 1)
+            response_headers[header.lower()] = value.strip()
+        if timing:
+            timing.headers_bytes = reader.received - received - \
+                (len(reader.buffer) - reader.pos)
+        return reader, version, status, explanation, response_headers
+    
+    def send_h2(self, conn, method, request_headers, payload, timing):
+        """
+        Sends the request as a new stream on a shared HTTP/2 connection and waits
+        for its response headers. Returns the same tuple as send_http1.
+        """
+        if timing: timing.request_start = time.perf_counter()
+        stream = conn.send_request(method, self, request_headers, payload)
+        if timing: timing.request_end = time.perf_counter()
+        response_headers = stream.wait_headers()
+        if timing: timing.response_start = time.perf_counter()
+        status = response_headers.pop(":status")
+        explanation = HTTP_REASONS.get(int(status), "")
+        return stream, "HTTP/2", status, explanation, response_headers
     
     def resolve(self, url):
         if "://" in url: return URL(url)
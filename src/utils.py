@@ -1,11 +1,20 @@
 from tkinter.font import Font
 import skia
+from text_metrics import FontMetrics
 
 def paint_tree(layout_object, display_list):
+    if not getattr(layout_object, "paint_dirty", True):
+        display_list.extend(layout_object.paint_cache)
+        return
+    start = len(display_list)
     display_list.extend(layout_object.paint())
 
     for child in layout_object.children:
         paint_tree(child, display_list)
+    
+    if hasattr(layout_object, "caches_paint") and layout_object.caches_paint():
+        layout_object.paint_cache = display_list[start:]
+        layout_object.paint_dirty = False
 
 def tree_to_list(tree, list):
     list.append(tree)
@@ -13,11 +22,29 @@ def tree_to_list(tree, list):
         tree_to_list(child, list)
     return list
 
+TYPEFACES = {}
+# Fonts are shared by every caller, and a page only uses a handful of sizes,
+# so each (size, weight, style) is built and measured once
 FONTS = {}
+FONT_METRICS = {}
 
 def get_font(size, weight, style) -> Font:
+    key = (size, weight, style)
+    font = FONTS.get(key)
+    if font is None:
+        font = FONTS[key] = skia.Font(get_typeface(weight, style), size)
+        FONT_METRICS[id(font)] = FontMetrics(font)
+    return font
+
+def font_metrics(font) -> FontMetrics:
+    """
+    Returns the precomputed metrics of a font returned by get_font.
+    """
+    return FONT_METRICS[id(font)]
+
+def get_typeface(weight, style):
     key = (weight, style)
-    if key not in FONTS:
+    if key not in TYPEFACES:
         if weight == "bold":
             skia_weight = skia.FontStyle.kBold_Weight
         else:
@@ -28,9 +55,8 @@ def get_font(size, weight, style) -> Font:
             skia_style = skia.FontStyle.kUpright_Slant
         skia_width = skia.FontStyle.kNormal_Width
         style_info = skia.FontStyle(skia_weight, skia_width, skia_style)
-        font = skia.Typeface('Arial', style_info)
-        FONTS[key] = font
-    return skia.Font(FONTS[key], size)
+        TYPEFACES[key] = skia.Typeface('Arial', style_info)
+    return TYPEFACES[key]
 
 NAMED_COLORS = {
     "black": "#000000",
@@ -46,6 +72,9 @@ NAMED_COLORS = {
 }
 
 def parse_color(color: str):
+    # Already parsed, as computed styles are
+    if isinstance(color, int):
+        return color
     if color.startswith("#") and len(color) == 7:
         r = int(color[1:3], 16)
         g = int(color[3:5], 16)
@@ -55,7 +84,3 @@ def parse_color(color: str):
         return parse_color(NAMED_COLORS[color])
     else:
         return skia.ColorBLACK
-    
-def linespace(font):
-    metrics = font.getMetrics()
-    return metrics.fDescent - metrics.fAscent
\ No newline at end of file
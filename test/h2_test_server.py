@@ -0,0 +1,101 @@
+import socket
+import threading
+import time
+
+import h2.config
+import h2.connection
+import h2.events
+
+
+# Simulated server think time per response, so multiplexing has something to hide
+LATENCY = 0.05
+RESOURCE_SIZE = 20 * 1024
+PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+
+s = socket.socket(
+    family=socket.AF_INET,
+    type=socket.SOCK_STREAM,
+    proto=socket.IPPROTO_TCP,
+)
+s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+s.bind(('', 8001))
+s.listen()
+
+
+def resource(path):
+    return ("/* " + path + " */\n" + "x" * RESOURCE_SIZE).encode('utf8')
+
+def handle_connection(conx):
+    conx.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    preface = conx.recv(len(PREFACE), socket.MSG_PEEK)
+    if preface == PREFACE:
+        handle_h2(conx)
+    else:
+        handle_http1(conx)
+    conx.close()
+
+def handle_http1(conx):
+    req = conx.makefile("b")
+    while True:
+        reqline = req.readline().decode('utf8')
+        if not reqline: return
+        method, url, version = reqline.split(" ", 2)
+        while True:
+            line = req.readline().decode('utf8')
+            if line in ('\r\n', ''): break
+        time.sleep(LATENCY)
+        body = resource(url)
+        response = "HTTP/1.1 200 OK\r\n"
+        response += "Content-Type: text/javascript\r\n"
+        response += "Cache-Control: no-store\r\n"
+        response += f"Content-Length: {len(body)}\r\n\r\n"
+        conx.sendall(response.encode('utf8') + body)
+
+def handle_h2(conx):
+    conn = h2.connection.H2Connection(config=h2.config.H2Configuration(
+        client_side=False, header_encoding="utf-8"))
+    lock = threading.Lock()
+    window_open = threading.Condition(lock)
+    with lock:
+        conn.initiate_connection()
+        conx.sendall(conn.data_to_send())
+
+    def respond(stream_id, path):
+        time.sleep(LATENCY)
+        body = resource(path)
+        with lock:
+            conn.send_headers(stream_id, [
+                (":status", "200"),
+                ("content-type", "text/javascript"),
+                ("cache-control", "no-store"),
+                ("content-length", str(len(body))),
+            ])
+            while body:
+                window = min(conn.local_flow_control_window(stream_id),
+                             conn.max_outbound_frame_size)
+                if window <= 0:
+                    window_open.wait()
+                    continue
+                chunk, body = body[:window], body[window:]
+                conn.send_data(stream_id, chunk, end_stream=not body)
+                conx.sendall(conn.data_to_send())
+
+    while True:
+        data = conx.recv(65535)
+        if not data: return
+        with lock:
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    path = dict(event.headers)[":path"]
+                    threading.Thread(
+                        target=respond, args=(event.stream_id, path)).start()
+                elif isinstance(event, h2.events.WindowUpdated):
+                    window_open.notify_all()
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            conx.sendall(conn.data_to_send())
+
+while True:
+    conx, addr = s.accept()
+    threading.Thread(target=handle_connection, args=(conx,)).start()